@@ -1,4 +1,5 @@
-from typing import ClassVar, Generator, Iterable
+import heapq
+from typing import ClassVar, Generator, Iterable, Sequence
 
 
 class Batched:
@@ -17,3 +18,15 @@ class Batched:
                 batch = []
         if batch:
             yield batch
+
+    @staticmethod
+    def balance(weights: Sequence[int], num_groups: int) -> list[list[int]]:
+        # Heaviest element first onto the least loaded group (LPT scheduling).
+        # Returns the element indices of each non-empty group.
+        groups: list[list[int]] = [[] for _ in range(min(num_groups, len(weights)))]
+        loads = [(0, groupidx) for groupidx in range(len(groups))]
+        for idx in sorted(range(len(weights)), key=lambda idx: -weights[idx]):
+            load, groupidx = heapq.heappop(loads)
+            groups[groupidx].append(idx)
+            heapq.heappush(loads, (load + weights[idx], groupidx))
+        return groups
@@ -1,7 +1,14 @@
 from .interface import IChatModel
+from .cache import ChatCacheSettings, IChatCache, MemoryChatCache, SQLiteChatCache
+from .impl.cached import CachedChatModel
 from .impl.openai import OpenAIChatModel
 
 __all__ = [
     "IChatModel",
+    "IChatCache",
+    "ChatCacheSettings",
+    "MemoryChatCache",
+    "SQLiteChatCache",
+    "CachedChatModel",
     "OpenAIChatModel",
 ]
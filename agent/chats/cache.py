@@ -0,0 +1,121 @@
+import asyncio
+import json
+import sqlite3
+import time
+from collections import OrderedDict
+from collections.abc import Generator
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Protocol
+
+from pydantic import BaseModel
+
+
+# Recorded deltas of one response, as dumped JSON objects
+CachedResponse = list[dict[str, Any]]
+
+
+class ChatCacheSettings(BaseModel):
+    max_entries: int = 1024
+    # Entries older than this are treated as missing, none when unset
+    ttl_seconds: float | None = 24 * 3600
+
+
+class IChatCache(Protocol):
+    async def aget(self, key: str) -> CachedResponse | None: ...
+
+    async def aset(self, key: str, response: CachedResponse) -> None: ...
+
+
+class MemoryChatCache:
+    # LRU over an ordered dict, most recently used entries at the end
+    def __init__(self, settings: ChatCacheSettings | None = None) -> None:
+        self.settings = settings or ChatCacheSettings()
+        self.entries: OrderedDict[str, tuple[float, CachedResponse]] = OrderedDict()
+
+    async def aget(self, key: str) -> CachedResponse | None:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+
+        created_at, response = entry
+        ttl_seconds = self.settings.ttl_seconds
+        if ttl_seconds is not None and time.time() - created_at > ttl_seconds:
+            del self.entries[key]
+            return None
+
+        self.entries.move_to_end(key)
+        return response
+
+    async def aset(self, key: str, response: CachedResponse) -> None:
+        self.entries[key] = (time.time(), response)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.settings.max_entries:
+            self.entries.popitem(last=False)
+
+
+class SQLiteChatCache:
+    # Survives restarts and is shared by processes using the same file. A
+    # short-lived connection per call keeps it safe to use from threads.
+    def __init__(self, dbpath: Path, settings: ChatCacheSettings | None = None) -> None:
+        self.dbpath = dbpath
+        self.settings = settings or ChatCacheSettings()
+        self.dbpath.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, "
+                "response TEXT NOT NULL, created_at REAL NOT NULL, "
+                "used_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS responses_used_at ON responses (used_at)"
+            )
+
+    @contextmanager
+    def _connect(self) -> Generator[sqlite3.Connection, None, None]:
+        conn = sqlite3.connect(self.dbpath, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, key: str) -> CachedResponse | None:
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+
+            response, created_at = row
+            ttl_seconds = self.settings.ttl_seconds
+            if ttl_seconds is not None and now - created_at > ttl_seconds:
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                return None
+
+            conn.execute("UPDATE responses SET used_at = ? WHERE key = ?", (now, key))
+        return json.loads(response)
+
+    def set(self, key: str, response: CachedResponse) -> None:
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, created_at, used_at) "
+                "VALUES (?, ?, ?, ?)",
+                (key, json.dumps(response), now, now),
+            )
+            # Least recently used entries beyond the limit
+            conn.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM responses "
+                "ORDER BY used_at DESC LIMIT -1 OFFSET ?)",
+                (self.settings.max_entries,),
+            )
+
+    async def aget(self, key: str) -> CachedResponse | None:
+        return await asyncio.to_thread(self.get, key)
+
+    async def aset(self, key: str, response: CachedResponse) -> None:
+        await asyncio.to_thread(self.set, key, response)
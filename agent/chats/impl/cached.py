@@ -0,0 +1,179 @@
+import asyncio
+import hashlib
+import json
+import logging
+from collections.abc import AsyncGenerator, Sequence
+from typing import Any
+
+from openai.types.chat.chat_completion_chunk import ChoiceDeltaToolCall
+from openai.types.chat.chat_completion_message_tool_call import (
+    ChatCompletionMessageToolCall,
+)
+from openai.types.chat.chat_completion_tool_param import (
+    ChatCompletionToolParam,
+)
+
+from agent.models.messages import AssistantMessage, Messages
+from agent.models.trusted import TrustedModels
+
+from ..cache import CachedResponse, IChatCache
+from ..interface import IChatModel
+
+
+logger = logging.getLogger(__name__)
+
+
+class CachedChatModel:
+    # Exact response cache for deterministic calls: only requests made at
+    # temperature 0 are looked up and stored, anything else goes straight to
+    # the wrapped model. Streams are recorded delta by delta and replayed as
+    # such, so consumers cannot tell a hit from a live response.
+    def __init__(
+        self,
+        chat_model: IChatModel,
+        cache: IChatCache,
+        deployment_name: str,
+    ) -> None:
+        self.chat_model = chat_model
+        self.cache = cache
+        self.deployment_name = deployment_name
+        # Streams the consumer stopped reading, finished to be cached
+        self._pending: set[asyncio.Task[None]] = set()
+
+    def cache_key(
+        self,
+        kind: str,
+        messages: Messages,
+        temperature: float,
+        max_completion_tokens: int | None,
+        tools: Sequence[ChatCompletionToolParam] | None,
+    ) -> str:
+        payload = json.dumps(
+            {
+                "kind": kind,
+                "deployment_name": self.deployment_name,
+                "messages": messages.model_dump(mode="json"),
+                "temperature": temperature,
+                "max_completion_tokens": max_completion_tokens,
+                "tools": tools or [],
+            },
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    @staticmethod
+    def _dump(message: AssistantMessage) -> dict[str, Any]:
+        return {
+            "content": message.content,
+            "tool_calls": [
+                tool_call.model_dump(mode="json")
+                for tool_call in message.tool_calls or []
+            ],
+        }
+
+    async def _record(
+        self,
+        key: str,
+        stream: AsyncGenerator[AssistantMessage, None],
+        deltas: CachedResponse,
+    ) -> None:
+        async for message in stream:
+            deltas.append(self._dump(message))
+        await self.cache.aset(key, deltas)
+
+    async def astream(
+        self,
+        messages: Messages,
+        temperature: float = 0.1,
+        max_completion_tokens: int | None = None,
+        *_: Any,
+        tools: Sequence[ChatCompletionToolParam] | None = None,
+        **__: Any,
+    ) -> AsyncGenerator[AssistantMessage, None]:
+        def upstream() -> AsyncGenerator[AssistantMessage, None]:
+            return self.chat_model.astream(
+                messages,
+                temperature=temperature,
+                max_completion_tokens=max_completion_tokens,
+                tools=tools,
+            )
+
+        if temperature != 0:
+            async for message in upstream():
+                yield message
+            return
+
+        key = self.cache_key(
+            "stream", messages, temperature, max_completion_tokens, tools
+        )
+        cached = await self.cache.aget(key)
+        if cached is not None:
+            logger.debug(f"Chat cache hit {key[:12]}")
+            for delta in cached:
+                yield TrustedModels.construct(
+                    AssistantMessage,
+                    content=delta["content"],
+                    tool_calls=[
+                        ChoiceDeltaToolCall.model_validate(tool_call)
+                        for tool_call in delta["tool_calls"]
+                    ]
+                    or None,
+                )
+            return
+
+        stream = upstream()
+        deltas: CachedResponse = []
+        try:
+            async for message in stream:
+                deltas.append(self._dump(message))
+                yield message
+        except GeneratorExit:
+            # Routing callers stop at the first tool call; the rest of the
+            # response is short, reading it makes the next call a hit
+            task = asyncio.create_task(self._record(key, stream, deltas))
+            self._pending.add(task)
+            task.add_done_callback(self._pending.discard)
+            raise
+        await self.cache.aset(key, deltas)
+
+    async def achat(
+        self,
+        messages: Messages,
+        temperature: float = 0.1,
+        max_completion_tokens: int | None = None,
+        *_: Any,
+        tools: Sequence[ChatCompletionToolParam] | None = None,
+        **__: Any,
+    ) -> AssistantMessage:
+        if temperature != 0:
+            return await self.chat_model.achat(
+                messages,
+                temperature=temperature,
+                max_completion_tokens=max_completion_tokens,
+                tools=tools,
+            )
+
+        key = self.cache_key(
+            "chat", messages, temperature, max_completion_tokens, tools
+        )
+        cached = await self.cache.aget(key)
+        if cached is not None:
+            logger.debug(f"Chat cache hit {key[:12]}")
+            return TrustedModels.construct(
+                AssistantMessage,
+                content=cached[0]["content"],
+                tool_calls=[
+                    ChatCompletionMessageToolCall.model_validate(tool_call)
+                    for tool_call in cached[0]["tool_calls"]
+                ],
+            )
+
+        message = await self.chat_model.achat(
+            messages,
+            temperature=temperature,
+            max_completion_tokens=max_completion_tokens,
+            tools=tools,
+        )
+        await self.cache.aset(key, [self._dump(message)])
+        return message
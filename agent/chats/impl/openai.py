@@ -5,6 +5,7 @@ from openai.types.chat.chat_completion_tool_param import (
     ChatCompletionToolParam,
 )
 from agent.models.messages import AssistantMessage, Messages
+from agent.models.trusted import TrustedModels
 
 
 class OpenAIChatModel:
@@ -50,7 +51,9 @@ class OpenAIChatModel:
             delta = response.choices[0].delta
             if delta is None:
                 continue
-            yield AssistantMessage(
+            # Deltas come straight from the OpenAI SDK, already typed
+            yield TrustedModels.construct(
+                AssistantMessage,
                 content=delta.content or "",
                 tool_calls=delta.tool_calls,
             )
@@ -10,20 +10,32 @@ from agent.programs import (
 from agent.text_splitters import (
     ITextSplitter,
     LangchainTextSplitter,
+    TiktokenTextSplitter,
 )
 from agent.searches import (
     TavilyWebSearch,
     IWebSearch,
 )
-from agent.chats import IChatModel, OpenAIChatModel
+from agent.chats import (
+    CachedChatModel,
+    ChatCacheSettings,
+    IChatCache,
+    IChatModel,
+    MemoryChatCache,
+    OpenAIChatModel,
+    SQLiteChatCache,
+)
 from agent.embeddings import IEmbeddingModel, SmallOpenAIEmbeddingModel
 from agent.extractors import (
     IExtractor,
     PDFExtractor,
+    PDFExtractorSettings,
 )
-from agent.storages.vectordb import Milvus
+from agent.storages.vectordb import EmbeddedVectorStore, IVectorStore, Milvus
 from agent.env import Env
-from agent.storages.local import Storage
+from agent.models.trusted import TrustedModels
+from agent.storages.blob import BlobIndex, IBlobStore, LocalBlobStore, S3BlobStore
+from agent.storages.local import ContentAddressedStorage, Storage
 
 
 class BaseProvider[NameT, ReturnT](ABC):
@@ -54,13 +66,28 @@ class ChatProvider(BaseProvider[Literal["azure_openai"], IChatModel]):
         }
 
     @lru_cache(maxsize=1)
-    def init_azure_openai(self) -> OpenAIChatModel:
-        return OpenAIChatModel(
+    def init_azure_openai(self) -> IChatModel:
+        chat_model = OpenAIChatModel(
             api_key=self.env.openai_api_key,
             api_version=self.env.openai_api_version,
             azure_endpoint=self.env.openai_azure_endpoint,
             deployment_name=self.env.openai_chat_deployment_name,
         )
+        if self.env.chat_cache_mode == "off":
+            return chat_model
+
+        settings = ChatCacheSettings(
+            max_entries=self.env.chat_cache_max_entries,
+            ttl_seconds=self.env.chat_cache_ttl_seconds,
+        )
+        cache: IChatCache
+        if self.env.chat_cache_mode == "disk":
+            cache = SQLiteChatCache(Path(self.env.chat_cache_path), settings)
+        else:
+            cache = MemoryChatCache(settings)
+        return CachedChatModel(
+            chat_model, cache, deployment_name=self.env.openai_chat_deployment_name
+        )
 
 
 class EmbeddingProvider(BaseProvider[Literal["azure_openai"], IEmbeddingModel]):
@@ -87,7 +114,7 @@ class EmbeddingProvider(BaseProvider[Literal["azure_openai"], IEmbeddingModel]):
 
 class TextSplitterProvider(
     BaseProvider[
-        Literal["langchain"],
+        Literal["langchain", "tiktoken"],
         ITextSplitter,
     ]
 ):
@@ -95,15 +122,22 @@ class TextSplitterProvider(
         self.env = env
 
     @property
-    def mp_name_init(self) -> dict[Literal["langchain"], Callable[[], ITextSplitter]]:
+    def mp_name_init(
+        self,
+    ) -> dict[Literal["langchain", "tiktoken"], Callable[[], ITextSplitter]]:
         return {
             "langchain": self.init_langchain_text_splitter,
+            "tiktoken": self.init_tiktoken_text_splitter,
         }
 
     @lru_cache(maxsize=1)
     def init_langchain_text_splitter(self) -> LangchainTextSplitter:
         return LangchainTextSplitter()
 
+    @lru_cache(maxsize=1)
+    def init_tiktoken_text_splitter(self) -> TiktokenTextSplitter:
+        return TiktokenTextSplitter()
+
 
 class ExtractorProvider(
     BaseProvider[
@@ -126,22 +160,35 @@ class ExtractorProvider(
 
     @lru_cache(maxsize=1)
     def init_pdf_extractor(self) -> PDFExtractor:
-        return PDFExtractor(self.storage, self.text_splitter_provider.get("langchain"))
+        return PDFExtractor(
+            self.storage,
+            self.text_splitter_provider.get("langchain"),
+            settings=PDFExtractorSettings(
+                cache_dir=(
+                    Path(self.env.extraction_cache_dir)
+                    if self.env.extraction_cache_dir
+                    else None
+                ),
+            ),
+        )
 
 
 class VectorDBProvider(
     BaseProvider[
-        Literal["milvus"],
-        Milvus,
+        Literal["milvus", "embedded"],
+        IVectorStore,
     ]
 ):
     def __init__(self, env: Env) -> None:
         self.env = env
 
     @property
-    def mp_name_init(self) -> dict[Literal["milvus"], Callable[[], Milvus]]:
+    def mp_name_init(
+        self,
+    ) -> dict[Literal["milvus", "embedded"], Callable[[], IVectorStore]]:
         return {
             "milvus": self.init_milvus,
+            "embedded": self.init_embedded,
         }
 
     @lru_cache(maxsize=1)
@@ -151,6 +198,12 @@ class VectorDBProvider(
             collection_name=self.env.milvus_collection_name,
         )
 
+    @lru_cache(maxsize=1)
+    def init_embedded(self) -> EmbeddedVectorStore:
+        return EmbeddedVectorStore(
+            storedir=Path(self.env.embedded_vectordb_dir),
+        )
+
 
 class WebSearchProvider(
     BaseProvider[
@@ -209,7 +262,34 @@ class ProgramProvider(
 class Container:
     def __init__(self, env: Env | None = None, storage: Storage | None = None) -> None:
         self.env = env or Env()
-        self.storage = storage or Storage(imagedir=Path("images"))
+        # Process-wide, worker processes started with spawn keep the default
+        TrustedModels.enabled = self.env.trusted_models
+        self.storage = storage or self.init_storage()
+
+    def init_storage(self) -> Storage:
+        imagedir = Path(self.env.image_dir)
+        if self.env.image_storage_mode == "path":
+            return Storage(imagedir=imagedir)
+
+        blobstore: IBlobStore
+        if self.env.image_blob_backend == "s3":
+            # Empty values copied from .env.example count as unset
+            if not self.env.image_s3_bucket:
+                raise ValueError("image_s3_bucket is required for the s3 backend")
+            blobstore = S3BlobStore(
+                bucket=self.env.image_s3_bucket,
+                cachedir=imagedir / "blobs",
+                prefix=self.env.image_s3_prefix,
+                endpoint_url=self.env.image_s3_endpoint_url or None,
+            )
+        else:
+            blobstore = LocalBlobStore(imagedir / "blobs")
+
+        return ContentAddressedStorage(
+            imagedir=imagedir,
+            blobstore=blobstore,
+            index=BlobIndex(imagedir / "index.sqlite"),
+        )
 
     @cached_property
     def chats(self) -> ChatProvider:
@@ -1,5 +1,7 @@
 import asyncio
 from typing import Any
+import numpy as np
+import numpy.typing as npt
 from openai import AsyncAzureOpenAI
 
 from agent.batched import Batched
@@ -26,12 +28,7 @@ class OpenAIEmbeddingModel[EmbeddingT: BaseEmbedding]:
         self.deployment_name = deployment_name
         self.batch_size = batch_size
 
-    async def aembedding(
-        self,
-        queries: list[str],
-        *_: Any,
-        **__: Any,
-    ) -> list[EmbeddingT]:
+    async def _aembed(self, queries: list[str]) -> list[list[float]]:
         embeddings = []
         for batched_queries in Batched.iter(queries, batch_size=self.batch_size):
             embeddings.extend(
@@ -45,14 +42,31 @@ class OpenAIEmbeddingModel[EmbeddingT: BaseEmbedding]:
                     ]
                 )
             )
+        return [embedding.data[0].embedding for embedding in embeddings]
+
+    async def aembedding(
+        self,
+        queries: list[str],
+        *_: Any,
+        **__: Any,
+    ) -> list[EmbeddingT]:
         return [
             self.EmbeddingCls(
                 query=query,
-                embedding=embedding.data[0].embedding,
+                embedding=embedding,
             )
-            for query, embedding in zip(queries, embeddings)
+            for query, embedding in zip(queries, await self._aembed(queries))
         ]
 
+    async def aembedding_vectors(
+        self,
+        queries: list[str],
+        *_: Any,
+        **__: Any,
+    ) -> npt.NDArray[np.float32]:
+        vectors = np.asarray(await self._aembed(queries), dtype=np.float32)
+        return vectors.reshape(len(queries), self.EmbeddingCls.size)
+
 
 class SmallOpenAIEmbeddingModel(OpenAIEmbeddingModel[SmallEmbedding]):
     EmbeddingCls = SmallEmbedding
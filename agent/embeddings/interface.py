@@ -1,5 +1,8 @@
 from typing import Any, Protocol
 
+import numpy as np
+import numpy.typing as npt
+
 from ..models.embeddings import Embedding
 
 
@@ -10,3 +13,10 @@ class IEmbeddingModel(Protocol):
         *_: Any,
         **__: Any,
     ) -> list[Embedding]: ...
+
+    async def aembedding_vectors(
+        self,
+        queries: list[str],
+        *_: Any,
+        **__: Any,
+    ) -> npt.NDArray[np.float32]: ...
@@ -1,3 +1,5 @@
+from typing import Literal
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -19,12 +21,51 @@ class OpenAIEmbeddingSettings(OpenAISettings):
     openai_embedding_deployment_name: str
 
 
+class ChatCacheEnvSettings(BaseSettings):
+    # Exact cache of temperature 0 chat calls, see `CachedChatModel`
+    chat_cache_mode: Literal["off", "memory", "disk"] = "off"
+    chat_cache_path: str = "chat_cache.db"
+    chat_cache_max_entries: int = 1024
+    chat_cache_ttl_seconds: float | None = 24 * 3600
+
+
+class TrustedModelsSettings(BaseSettings):
+    # Skip validation of models built from our own data, see `TrustedModels`
+    trusted_models: bool = False
+
+
 class MilvusSettings(BaseSettings):
     milvus_collection_name: str
     milvus_uri: str
     milvus_token: str
 
 
+class EmbeddedVectorStoreSettings(BaseSettings):
+    embedded_vectordb_dir: str = "vectordb"
+
+
+class ExtractorSettings(BaseSettings):
+    extraction_cache_dir: str | None = None
+
+
+class ImageStorageSettings(BaseSettings):
+    image_dir: str = "images"
+    # path: one file per path, content_addressed: one blob per distinct image
+    image_storage_mode: Literal["path", "content_addressed"] = "path"
+    image_blob_backend: Literal["local", "s3"] = "local"
+    image_s3_bucket: str | None = None
+    image_s3_prefix: str = ""
+    # Set to a MinIO endpoint (e.g. http://localhost:9000) for local runs
+    image_s3_endpoint_url: str | None = None
+
+
+class IndexingSettings(BaseSettings):
+    # Progress of the indexing runs, see `IndexingManifest`
+    indexing_manifest_path: str = "indexing_manifest.db"
+    # Jobs shared by `indexing.py worker` processes
+    indexing_queue_path: str = "indexing_queue.db"
+
+
 class TavilyWebSearchSettings(BaseSettings):
     tavily_api_key: str
 
@@ -32,7 +73,13 @@ class TavilyWebSearchSettings(BaseSettings):
 class Env(
     OpenAIChatSettings,
     OpenAIEmbeddingSettings,
+    ChatCacheEnvSettings,
+    TrustedModelsSettings,
     MilvusSettings,
+    EmbeddedVectorStoreSettings,
+    ExtractorSettings,
+    ImageStorageSettings,
+    IndexingSettings,
     TavilyWebSearchSettings,
     BaseSettings,
 ):
@@ -1,8 +1,17 @@
 from .interface import IExtractor
-from .impl.pdf import PDFExtractor
+from .impl.pdf import PDFExtractor, PDFExtractorSettings
+from .pages import ExtractedPage, ExtractedPages
+from .source import DocumentInput, DocumentSource
+from .stats import ExtractionStats
 
 
 __all__ = [
     "IExtractor",
+    "ExtractionStats",
+    "DocumentInput",
+    "DocumentSource",
+    "ExtractedPage",
+    "ExtractedPages",
     "PDFExtractor",
+    "PDFExtractorSettings",
 ]
@@ -0,0 +1,112 @@
+import hashlib
+import math
+import re
+from collections import Counter
+from collections.abc import Generator
+from typing import ClassVar
+
+import pymupdf
+from pydantic import BaseModel
+
+
+class BoilerplateSettings(BaseModel):
+    enabled: bool = True
+    # Top and bottom share of the page height where headers and footers live
+    margin_ratio: float = 0.12
+    # A margin line is boilerplate when found on this share of the pages
+    margin_page_ratio: float = 0.5
+    # Any other line needs to be found on nearly every page
+    body_page_ratio: float = 0.8
+    # Documents shorter than this have too few pages to tell
+    min_pages: int = 3
+
+
+class PageLines(BaseModel):
+    margin: set[str]
+    body: set[str]
+
+
+class Boilerplate:
+    DIGITS_PATTERN: ClassVar[re.Pattern[str]] = re.compile(r"\d+")
+    # Letters a line needs before it is stripped outside of the margins
+    MIN_BODY_LETTERS: ClassVar[int] = 3
+
+    @classmethod
+    def normalize(cls, line: str) -> str:
+        # Page numbers and dates differ from page to page, digits are masked
+        return cls.DIGITS_PATTERN.sub("#", " ".join(line.split())).lower()
+
+    @classmethod
+    def strippable_in_body(cls, normalized: str) -> bool:
+        # Masked page numbers, prices or times also make up body lines, only
+        # lines with words of their own are stripped wherever they sit
+        return "#" not in normalized and (
+            sum(char.isalpha() for char in normalized) >= cls.MIN_BODY_LETTERS
+        )
+
+    @staticmethod
+    def blocks(
+        page: pymupdf.Page, margin_ratio: float
+    ) -> Generator[tuple[str, bool], None, None]:
+        # Text blocks in reading order, and whether they sit in a margin
+        height = page.rect.height
+        top, bottom = height * margin_ratio, height * (1.0 - margin_ratio)
+        for x0, y0, x1, y1, text, _, block_type in page.get_text("blocks"):
+            if block_type == 0:
+                yield text, y1 <= top or y0 >= bottom
+
+    @classmethod
+    def collect(cls, page: pymupdf.Page, margin_ratio: float) -> PageLines:
+        lines = PageLines(margin=set(), body=set())
+        for text, in_margin in cls.blocks(page, margin_ratio):
+            for line in text.splitlines():
+                if normalized := cls.normalize(line):
+                    (lines.margin if in_margin else lines.body).add(normalized)
+        return lines
+
+    @staticmethod
+    def detect(
+        pages_lines: list[PageLines], settings: BoilerplateSettings
+    ) -> frozenset[str]:
+        num_pages = len(pages_lines)
+        if not settings.enabled or num_pages < settings.min_pages:
+            return frozenset()
+
+        margin_counts = Counter(line for lines in pages_lines for line in lines.margin)
+        counts = Counter(
+            line for lines in pages_lines for line in lines.margin | lines.body
+        )
+        margin_min_count = max(
+            settings.min_pages, math.ceil(settings.margin_page_ratio * num_pages)
+        )
+        body_min_count = max(
+            settings.min_pages, math.ceil(settings.body_page_ratio * num_pages)
+        )
+        return frozenset(
+            line
+            for line, count in counts.items()
+            if count >= body_min_count or margin_counts[line] >= margin_min_count
+        )
+
+    @staticmethod
+    def digest(boilerplate: frozenset[str]) -> str:
+        return hashlib.sha256("\n".join(sorted(boilerplate)).encode()).hexdigest()
+
+    @classmethod
+    def strip(
+        cls, page: pymupdf.Page, boilerplate: frozenset[str], margin_ratio: float
+    ) -> tuple[str, str]:
+        # Returns the kept text and the removed lines of the page
+        if not boilerplate:
+            return page.get_text(), ""
+
+        kept: list[str] = []
+        removed: list[str] = []
+        for text, in_margin in cls.blocks(page, margin_ratio):
+            for line in text.splitlines(keepends=True):
+                normalized = cls.normalize(line)
+                is_boilerplate = normalized in boilerplate and (
+                    in_margin or cls.strippable_in_body(normalized)
+                )
+                (removed if is_boilerplate else kept).append(line)
+        return "".join(kept), "".join(removed)
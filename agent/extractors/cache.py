@@ -0,0 +1,104 @@
+import hashlib
+import json
+import os
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, ClassVar
+
+import pymupdf
+from pydantic import BaseModel, ValidationError
+
+
+class CachedPage(BaseModel):
+    text: str
+    imagepath: str
+    thumbnailpath: str | None = None
+    splitted_texts: list[str]
+    num_tokens: list[int | None]
+    num_tokens_removed: int = 0
+
+
+@dataclass
+class ExtractionCache:
+    # Bumped whenever the way pages are extracted changes
+    VERSION: ClassVar[int] = 4
+
+    cachedir: Path
+    settings_hash: str
+
+    def __post_init__(self) -> None:
+        self.cachedir.mkdir(parents=True, exist_ok=True)
+
+    @classmethod
+    def hash_settings(cls, settings: dict[str, Any]) -> str:
+        payload = json.dumps(
+            {"version": cls.VERSION, "settings": settings},
+            sort_keys=True,
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    XREF_PATTERN: ClassVar[re.Pattern[str]] = re.compile(r"(\d+) \d+ R")
+
+    @classmethod
+    def _referenced_xrefs(
+        cls, document: pymupdf.Document, xref: int, key: str
+    ) -> list[int]:
+        kind, value = document.xref_get_key(xref, key)
+        if kind not in ("xref", "dict", "array"):
+            return []
+        return [int(ref) for ref in cls.XREF_PATTERN.findall(value)]
+
+    @classmethod
+    def hash_page(cls, document: pymupdf.Document, page: pymupdf.Page) -> str:
+        # The page content stream plus every image and font it references,
+        # the form XObjects it draws (recursively) and annotation appearances
+        digest = hashlib.sha256(page.read_contents())
+        digest.update(repr(tuple(page.rect)).encode())
+
+        xrefs = [
+            xref
+            for xref, *_ in [
+                *page.get_images(full=True),
+                *page.get_fonts(full=True),
+                *page.get_xobjects(),
+            ]
+        ]
+        for annot in page.annots():
+            xrefs.extend(cls._referenced_xrefs(document, annot.xref, "AP/N"))
+
+        seen: set[int] = set()
+        while xrefs:
+            xref = xrefs.pop()
+            if xref <= 0 or xref in seen:
+                continue
+            seen.add(xref)
+            digest.update(document.xref_object(xref, compressed=True).encode())
+            digest.update(document.xref_stream_raw(xref) or b"")
+            # Forms nested in forms and appearance streams
+            xrefs.extend(cls._referenced_xrefs(document, xref, "Resources/XObject"))
+        return digest.hexdigest()
+
+    def _path(self, page_key: str) -> Path:
+        key = hashlib.sha256(f"{self.settings_hash}:{page_key}".encode()).hexdigest()
+        return self.cachedir / key[:2] / f"{key}.json"
+
+    def get(self, page_key: str) -> CachedPage | None:
+        path = self._path(page_key)
+        if not path.exists():
+            return None
+
+        try:
+            return CachedPage.model_validate_json(path.read_bytes())
+        except ValidationError:
+            path.unlink(missing_ok=True)
+            return None
+
+    def put(self, page_key: str, page: CachedPage) -> None:
+        path = self._path(page_key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        # Written aside and renamed, so concurrent readers never see half a file
+        tmppath = path.with_suffix(f".{os.getpid()}.tmp")
+        tmppath.write_text(page.model_dump_json())
+        tmppath.replace(path)
@@ -1,18 +1,47 @@
 import asyncio
-from concurrent.futures import Executor, ProcessPoolExecutor
+import itertools
+import logging
+from collections import deque
+from collections.abc import AsyncGenerator, Collection
+from concurrent.futures import (
+    Executor,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+)
 from pathlib import Path
-from typing import Any
+from typing import Any, Literal
 
 import pymupdf
 from pydantic import BaseModel
 
 from agent.batched import Batched
+from agent.extractors.boilerplate import Boilerplate, BoilerplateSettings, PageLines
+from agent.extractors.cache import CachedPage, ExtractionCache
+from agent.extractors.pages import ExtractedPage, ExtractedPages
+from agent.extractors.source import DocumentInput, DocumentSource
+from agent.extractors.stats import ExtractionStats
 from agent.storages.local import Storage
+from agent.storages.render import PageRenderRequest
 from agent.text_splitters import (
     ITextSplitter,
     TextSplitterArguments,
 )
-from agent.models.document import Chunk, Document, DocumentMetadata
+from agent.models.document import Chunk, ChunkBatch, Document, Source
+
+
+logger = logging.getLogger(__name__)
+
+
+class PDFRenderSettings(BaseModel):
+    # eager: render while extracting, lazy: render on first
+    # `Storage.get_localpath`, off: no rendered pages at all
+    mode: Literal["eager", "lazy", "off"] = "eager"
+    dpi: int = 72
+    format: Literal["png", "jpeg", "webp"] = "png"
+    quality: int = 85
+    # Longest side of an additional thumbnail, none when unset
+    thumbnail_size: int | None = None
 
 
 class PDFExtractorSettings(BaseModel):
@@ -22,7 +51,158 @@ class PDFExtractorSettings(BaseModel):
         encoding_model_name="gpt-4o",
     )
     number_executor_split_tokens: int = 2
-    batch_size: int = 2
+    number_executor_extract_pages: int = 2
+    pages_per_task: int = 4
+    max_pending_tasks: int = 4
+    number_threads_save_images: int = 4
+    render: PDFRenderSettings = PDFRenderSettings()
+    boilerplate: BoilerplateSettings = BoilerplateSettings()
+    # Pages whose content and settings are unchanged are served from here
+    cache_dir: Path | None = None
+
+
+def _render_page(
+    page: pymupdf.Page,
+    request: PageRenderRequest,
+    relpath: str,
+    storage: Storage,
+    mode: Literal["eager", "lazy"],
+    writer: Executor,
+) -> Future[Path]:
+    if mode == "lazy":
+        return writer.submit(storage.save_render_request, request, relpath)
+
+    # Rasterising stays on this thread, pymupdf is not thread-safe; encoding
+    # and writing the image go to the writer threads.
+    return writer.submit(
+        storage.save_image,
+        request.render_page(page),
+        relpath,
+        **request.save_kwargs,
+    )
+
+
+def _extract_pages(
+    source: DocumentSource,
+    pageidxs: list[int],
+    storage: Storage,
+    settings: PDFRenderSettings,
+    cache: ExtractionCache | None = None,
+    number_threads_save_images: int = 4,
+    boilerplate: frozenset[str] = frozenset(),
+    boilerplate_settings: BoilerplateSettings = BoilerplateSettings(),
+) -> list[ExtractedPage]:
+    # Runs in a worker process, which opens its own handle on the document
+    pages: list[ExtractedPage] = []
+    writes: list[Future[Path]] = []
+    # In-memory documents cannot be reopened later to render on demand
+    mode: Literal["eager", "lazy", "off"] = settings.mode
+    if mode == "lazy" and source.in_memory:
+        mode = "eager"
+    with (
+        source.open() as document,
+        ThreadPoolExecutor(max_workers=number_threads_save_images) as writer,
+    ):
+        for pageidx in pageidxs:
+            page = document[pageidx - 1]
+            cache_key: str | None = None
+            cached: CachedPage | None = None
+            name = f"page{pageidx}"
+            if cache is not None:
+                page_hash = cache.hash_page(document, page)
+                # Stripped text also depends on the boilerplate of the document
+                cache_key = f"{page_hash}:{Boilerplate.digest(boilerplate)}"
+                cached = cache.get(cache_key)
+                # Images are named by content, so a cached path is never
+                # overwritten by a different version of the same page
+                name = f"page{pageidx}-{page_hash[:16]}"
+
+            if cached is not None:
+                extracted_page = ExtractedPage(
+                    pageidx,
+                    cached.text,
+                    imagepath="",
+                    cache_key=cache_key,
+                    splitted_texts=cached.splitted_texts,
+                    num_tokens=cached.num_tokens,
+                    num_tokens_removed=cached.num_tokens_removed,
+                )
+            else:
+                text, removed_text = Boilerplate.strip(
+                    page, boilerplate, boilerplate_settings.margin_ratio
+                )
+                extracted_page = ExtractedPage(
+                    pageidx,
+                    text,
+                    imagepath="",
+                    removed_text=removed_text,
+                    cache_key=cache_key,
+                )
+            pages.append(extracted_page)
+            if mode == "off":
+                continue
+
+            request = PageRenderRequest(
+                filepath=source.filepath.absolute() if source.filepath else None,
+                pageidx=pageidx,
+                dpi=settings.dpi,
+                format=settings.format,
+                quality=settings.quality,
+            )
+            extracted_page.imagepath = storage.gen_path(
+                reldir=source.name, name=name, ext=settings.format
+            )
+            if cache is None or not storage.exists(extracted_page.imagepath):
+                writes.append(
+                    _render_page(
+                        page,
+                        request,
+                        extracted_page.imagepath,
+                        storage,
+                        mode,
+                        writer,
+                    )
+                )
+
+            if settings.thumbnail_size is not None:
+                extracted_page.thumbnailpath = storage.gen_path(
+                    reldir=source.name,
+                    name=f"{name}.thumbnail",
+                    ext=settings.format,
+                )
+                if cache is None or not storage.exists(extracted_page.thumbnailpath):
+                    writes.append(
+                        _render_page(
+                            page,
+                            request.model_copy(
+                                update={"max_size": settings.thumbnail_size}
+                            ),
+                            extracted_page.thumbnailpath,
+                            storage,
+                            mode,
+                            writer,
+                        )
+                    )
+
+    # Surface the first failed write, if any
+    for write in writes:
+        write.result()
+    return pages
+
+
+def _collect_lines(
+    source: DocumentSource, pageidxs: list[int], margin_ratio: float
+) -> list[PageLines]:
+    with source.open() as document:
+        return [
+            Boilerplate.collect(document[pageidx - 1], margin_ratio)
+            for pageidx in pageidxs
+        ]
+
+
+def _count_pages(source: DocumentSource) -> int:
+    with source.open() as document:
+        return document.page_count
 
 
 class PDFExtractor:
@@ -32,6 +212,7 @@ class PDFExtractor:
         text_splitter: ITextSplitter,
         settings: PDFExtractorSettings | None = None,
         executor_split_tokens: Executor | None = None,
+        executor_extract_pages: Executor | None = None,
     ):
         self.storage = storage
         self.text_splitter = text_splitter
@@ -39,56 +220,269 @@ class PDFExtractor:
         self.executor_split_tokens = executor_split_tokens or ProcessPoolExecutor(
             max_workers=self.settings.number_executor_split_tokens
         )
+        self.executor_extract_pages = executor_extract_pages or ProcessPoolExecutor(
+            max_workers=self.settings.number_executor_extract_pages
+        )
+        self.cache: ExtractionCache | None = None
+        if self.settings.cache_dir is not None:
+            self.cache = ExtractionCache(
+                cachedir=self.settings.cache_dir,
+                settings_hash=ExtractionCache.hash_settings(
+                    self.settings.model_dump(
+                        mode="json",
+                        include={"text_splitter_arguments", "render", "boilerplate"},
+                    )
+                ),
+            )
+
+    async def aextract(
+        self,
+        source: DocumentInput,
+        *_: Any,
+        document_key: str | None = None,
+        **__: Any,
+    ) -> Document:
+        return Document(
+            filename=DocumentSource.key_of(source, document_key),
+            chunks=[
+                chunk
+                async for chunk in self.aiter_chunks(source, document_key=document_key)
+            ],
+        )
 
-    async def aextract(self, filepath: Path, *_: Any, **__: Any) -> Document:
-        pages_content: list[str] = []
-        pages_imagepath: list[str] = []
-        with pymupdf.Document(filepath) as document:
-            for pageidx, page in enumerate(document, start=1):
-                pages_content.append(page.get_text())
+    async def aextract_batch(
+        self,
+        source: DocumentInput,
+        *_: Any,
+        document_key: str | None = None,
+        **__: Any,
+    ) -> ChunkBatch:
+        return ChunkBatch.concat(
+            [
+                batch
+                async for batch in self.aiter_batches(source, document_key=document_key)
+            ]
+        )
+
+    async def aiter_chunks(
+        self,
+        source: DocumentInput,
+        *_: Any,
+        document_key: str | None = None,
+        **__: Any,
+    ) -> AsyncGenerator[Chunk, None]:
+        async for batch in self.aiter_batches(source, document_key=document_key):
+            for chunk in batch.iter_chunks():
+                yield chunk
 
-                relpath = self.storage.gen_path(
-                    reldir=filepath.name, name=f"page{pageidx}"
+    async def adetect_boilerplate(
+        self, source: DocumentSource, num_pages: int
+    ) -> frozenset[str]:
+        settings = self.settings.boilerplate
+        if not settings.enabled or num_pages < settings.min_pages:
+            return frozenset()
+
+        # Pre-pass over every page, one contiguous page range per worker
+        loop = asyncio.get_event_loop()
+        num_workers = self.settings.number_executor_extract_pages
+        pages_lines_ranges = await asyncio.gather(
+            *[
+                loop.run_in_executor(
+                    self.executor_extract_pages,
+                    _collect_lines,
+                    source,
+                    pageidxs,
+                    settings.margin_ratio,
+                )
+                for pageidxs in Batched.iter(
+                    range(1, num_pages + 1),
+                    batch_size=-(-num_pages // num_workers),
                 )
-                self.storage.save_image(page.get_pixmap(), relpath)
-                pages_imagepath.append(relpath)
+            ]
+        )
+        return Boilerplate.detect(
+            [lines for pages_lines in pages_lines_ranges for lines in pages_lines],
+            settings,
+        )
 
-        splitted_texts_list: list[list[str]] = []
-        for batched_pages_content in Batched.iter(
-            pages_content, batch_size=self.settings.batch_size
+    async def aiter_batches(
+        self,
+        source: DocumentInput,
+        *_: Any,
+        document_key: str | None = None,
+        stats: ExtractionStats | None = None,
+        **__: Any,
+    ) -> AsyncGenerator[ChunkBatch, None]:
+        stats = stats or ExtractionStats()
+        async for pages in self.aiter_pages(
+            source, document_key=document_key, stats=stats
         ):
-            # <batch-size> pages at a time
-            splitted_texts_list.extend(
-                await asyncio.gather(
-                    *[
-                        self.text_splitter.asplit_text(
-                            page_content,
-                            arguments=self.settings.text_splitter_arguments,
-                        )
-                        for page_content in batched_pages_content
-                    ]
+            batch = await self.abatch_pages(pages, stats=stats)
+            if len(batch) > 0:
+                yield batch
+
+        logger.info(f"Extracted {DocumentSource.key_of(source, document_key)}: {stats}")
+
+    async def aiter_pages(
+        self,
+        source: DocumentInput,
+        *_: Any,
+        document_key: str | None = None,
+        stats: ExtractionStats | None = None,
+        pageidxs: Collection[int] | None = None,
+        **__: Any,
+    ) -> AsyncGenerator[ExtractedPages, None]:
+        # Yields `pages_per_task` pages at a time, in page order. At most
+        # `max_pending_tasks` page ranges are extracted ahead of the consumer.
+        # `document_key` names derived files and is required for in-memory
+        # sources; paths default to the path itself. `pageidxs` restricts
+        # extraction to these (1-based) pages.
+        async with DocumentSource.acreate(source, document_key) as document_source:
+            async for pages in self._aiter_pages(document_source, stats, pageidxs):
+                yield pages
+
+    async def acount_pages(
+        self,
+        source: DocumentInput,
+        *_: Any,
+        document_key: str | None = None,
+        **__: Any,
+    ) -> int:
+        async with DocumentSource.acreate(source, document_key) as document_source:
+            return await asyncio.to_thread(_count_pages, document_source)
+
+    async def _aiter_pages(
+        self,
+        source: DocumentSource,
+        stats: ExtractionStats | None = None,
+        pageidxs: Collection[int] | None = None,
+    ) -> AsyncGenerator[ExtractedPages, None]:
+        loop = asyncio.get_event_loop()
+        num_pages = await asyncio.to_thread(_count_pages, source)
+        boilerplate = await self.adetect_boilerplate(source, num_pages)
+        if stats is not None:
+            stats.num_boilerplate_lines += len(boilerplate)
+        pageidxs_iter = Batched.iter(
+            range(1, num_pages + 1) if pageidxs is None else sorted(pageidxs),
+            batch_size=self.settings.pages_per_task,
+        )
+
+        pending: deque[asyncio.Future[list[ExtractedPage]]] = deque()
+
+        def submit() -> None:
+            num_tasks = self.settings.max_pending_tasks - len(pending)
+            for pageidxs in itertools.islice(pageidxs_iter, max(num_tasks, 0)):
+                pending.append(
+                    loop.run_in_executor(
+                        self.executor_extract_pages,
+                        _extract_pages,
+                        source,
+                        pageidxs,
+                        self.storage,
+                        self.settings.render,
+                        self.cache,
+                        self.settings.number_threads_save_images,
+                        boilerplate,
+                        self.settings.boilerplate,
+                    )
                 )
+
+        try:
+            submit()
+            while pending:
+                pages = await pending.popleft()
+                submit()
+                yield ExtractedPages(source.document_key, pages)
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def _cache_pages(self, pages: list[ExtractedPage]) -> None:
+        if self.cache is None:
+            return
+
+        for page in pages:
+            if page.cache_key is None or page.splitted_texts is None:
+                continue
+            self.cache.put(
+                page.cache_key,
+                CachedPage(
+                    text=page.text,
+                    imagepath=page.imagepath,
+                    thumbnailpath=page.thumbnailpath,
+                    splitted_texts=page.splitted_texts,
+                    num_tokens=page.num_tokens or [None] * len(page.splitted_texts),
+                    num_tokens_removed=page.num_tokens_removed or 0,
+                ),
             )
 
-        chunks = []
-        for pageidx, (splitted_texts, imagepath) in enumerate(
-            zip(splitted_texts_list, pages_imagepath), start=1
-        ):
-            chunks.extend(
-                [
-                    Chunk(
-                        text=splitted_text,
-                        metadata=DocumentMetadata(
-                            filename=str(filepath),
-                            pageidx=pageidx,
-                            rendered_page_path=imagepath,
-                        ),
-                    )
-                    for splitted_text in splitted_texts
-                ]
+    async def abatch_pages(
+        self, extracted_pages: ExtractedPages, stats: ExtractionStats | None = None
+    ) -> ChunkBatch:
+        # Pages served from the extraction cache are already split and counted
+        pages = extracted_pages.pages
+        new_pages = [page for page in pages if page.splitted_texts is None]
+        if new_pages:
+            splitted_texts_list = await self.text_splitter.asplit_texts(
+                [page.text for page in new_pages],
+                arguments=self.settings.text_splitter_arguments,
             )
 
-        return Document(
-            filename=str(filepath),
-            chunks=chunks,
+            # Counted once here and stored with the chunk for prompt budgeting,
+            # along with the boilerplate that was stripped from each page
+            num_tokens_iter = iter(
+                await self.text_splitter.acount_tokens(
+                    [
+                        *(text for texts in splitted_texts_list for text in texts),
+                        *(page.removed_text for page in new_pages),
+                    ],
+                    arguments=self.settings.text_splitter_arguments,
+                )
+            )
+            for page, splitted_texts in zip(new_pages, splitted_texts_list):
+                page.splitted_texts = splitted_texts
+                page.num_tokens = [next(num_tokens_iter) for _ in splitted_texts]
+            for page in new_pages:
+                page.num_tokens_removed = next(num_tokens_iter)
+            await asyncio.to_thread(self._cache_pages, new_pages)
+
+        chunk_ids: list[str] = []
+        texts: list[str] = []
+        num_tokens: list[int | None] = []
+        pageidxs: list[int] = []
+        imagepaths: list[str] = []
+        thumbnailpaths: list[str | None] = []
+        for page in pages:
+            splitted_texts = page.splitted_texts or []
+            chunk_ids.extend(
+                ChunkBatch.chunk_id_of(extracted_pages.document_key, page.pageidx, idx)
+                for idx in range(len(splitted_texts))
+            )
+            texts.extend(splitted_texts)
+            num_tokens.extend(page.num_tokens or [None] * len(splitted_texts))
+            pageidxs.extend([page.pageidx] * len(splitted_texts))
+            imagepaths.extend([page.imagepath] * len(splitted_texts))
+            thumbnailpaths.extend([page.thumbnailpath] * len(splitted_texts))
+
+        metadata: dict[str, list[Any]] = {
+            "source": [Source.DOCUMENT] * len(texts),
+            "filename": [extracted_pages.document_key] * len(texts),
+            "pageidx": pageidxs,
+            "rendered_page_path": imagepaths,
+        }
+        render = self.settings.render
+        if render.mode != "off" and render.thumbnail_size is not None:
+            metadata["thumbnail_path"] = thumbnailpaths
+
+        if stats is not None:
+            stats.num_pages += len(pages)
+            stats.num_cached_pages += len(pages) - len(new_pages)
+            stats.num_chunks += len(texts)
+            stats.num_tokens += sum(num or 0 for num in num_tokens)
+            stats.num_tokens_saved += sum(
+                page.num_tokens_removed or 0 for page in pages
+            )
+
+        return ChunkBatch.from_texts(
+            texts, num_tokens=num_tokens, metadata=metadata, chunk_ids=chunk_ids
         )
@@ -1,8 +1,33 @@
-from pathlib import Path
+from collections.abc import AsyncGenerator
 from typing import Any, Protocol
 
-from ..models.document import Document
+from ..models.document import Chunk, ChunkBatch, Document
+from .pages import ExtractedPages
+from .source import DocumentInput
+from .stats import ExtractionStats
 
 
 class IExtractor(Protocol):
-    async def aextract(self, filepath: Path, *_: Any, **__: Any) -> Document: ...
+    async def aextract(self, source: DocumentInput, *_: Any, **__: Any) -> Document: ...
+
+    async def aextract_batch(
+        self, source: DocumentInput, *_: Any, **__: Any
+    ) -> ChunkBatch: ...
+
+    def aiter_chunks(
+        self, source: DocumentInput, *_: Any, **__: Any
+    ) -> AsyncGenerator[Chunk, None]: ...
+
+    def aiter_batches(
+        self, source: DocumentInput, *_: Any, **__: Any
+    ) -> AsyncGenerator[ChunkBatch, None]: ...
+
+    async def acount_pages(self, source: DocumentInput, *_: Any, **__: Any) -> int: ...
+
+    def aiter_pages(
+        self, source: DocumentInput, *_: Any, **__: Any
+    ) -> AsyncGenerator[ExtractedPages, None]: ...
+
+    async def abatch_pages(
+        self, extracted_pages: ExtractedPages, stats: ExtractionStats | None = None
+    ) -> ChunkBatch: ...
@@ -0,0 +1,28 @@
+from dataclasses import dataclass
+
+
+@dataclass
+class ExtractedPage:
+    pageidx: int
+    text: str
+    imagepath: str
+    thumbnailpath: str | None = None
+    # Boilerplate lines stripped from the page text
+    removed_text: str = ""
+    # Set when the extraction cache is enabled
+    cache_key: str | None = None
+    # Set for pages served from the extraction cache
+    splitted_texts: list[str] | None = None
+    num_tokens: list[int | None] | None = None
+    num_tokens_removed: int | None = None
+
+
+@dataclass
+class ExtractedPages:
+    # Consecutive pages of one document, the unit handed from page
+    # extraction to splitting
+    document_key: str
+    pages: list[ExtractedPage]
+
+    def __len__(self) -> int:
+        return len(self.pages)
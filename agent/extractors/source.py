@@ -0,0 +1,96 @@
+from collections.abc import AsyncGenerator, AsyncIterable, Generator
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass
+from multiprocessing.shared_memory import SharedMemory
+from pathlib import Path
+
+import pymupdf
+
+
+DocumentInput = Path | bytes | memoryview | AsyncIterable[bytes]
+
+
+@dataclass
+class DocumentSource:
+    # Picklable handle on a document, for worker processes. In-memory inputs
+    # are placed once in shared memory, which workers open without copying.
+    document_key: str
+    filepath: Path | None = None
+    shm_name: str | None = None
+    size: int = 0
+
+    @property
+    def in_memory(self) -> bool:
+        return self.filepath is None
+
+    @staticmethod
+    def key_of(source: DocumentInput, document_key: str | None = None) -> str:
+        if document_key is not None:
+            return document_key
+        if isinstance(source, Path):
+            return str(source)
+        raise ValueError("A document_key is required for in-memory documents")
+
+    @property
+    def name(self) -> str:
+        # Directory for derived files, such as rendered pages
+        if self.filepath is not None and self.document_key == str(self.filepath):
+            return self.filepath.name
+        return self.document_key
+
+    @staticmethod
+    def _buffer(shm: SharedMemory) -> memoryview:
+        # Typed as optional, it is None once the segment is closed
+        if shm.buf is None:
+            raise ValueError(f"Shared memory {shm.name} is closed")
+        return shm.buf
+
+    @contextmanager
+    def open(self) -> Generator[pymupdf.Document, None, None]:
+        if self.filepath is not None:
+            with pymupdf.Document(self.filepath) as document:
+                yield document
+            return
+
+        shm = SharedMemory(name=self.shm_name)
+        view = self._buffer(shm)[: self.size]
+        try:
+            with pymupdf.Document(stream=view, filetype="pdf") as document:
+                yield document
+        finally:
+            view.release()
+            shm.close()
+
+    @classmethod
+    @asynccontextmanager
+    async def acreate(
+        cls, source: DocumentInput, document_key: str | None = None
+    ) -> AsyncGenerator["DocumentSource", None]:
+        document_key = cls.key_of(source, document_key)
+        if isinstance(source, Path):
+            yield cls(document_key=document_key, filepath=source)
+            return
+
+        parts: list[bytes | memoryview]
+        if isinstance(source, (bytes, memoryview)):
+            parts = [source]
+        else:
+            parts = [part async for part in source]
+
+        size = sum(len(part) for part in parts)
+        if size == 0:
+            raise ValueError(f"Document {document_key} is empty")
+
+        shm = SharedMemory(create=True, size=size)
+        try:
+            buffer = cls._buffer(shm)
+            offset = 0
+            for part in parts:
+                buffer[offset : offset + len(part)] = part
+                offset += len(part)
+            del parts
+
+            yield cls(document_key=document_key, shm_name=shm.name, size=size)
+        finally:
+            shm.close()
+            shm.unlink()
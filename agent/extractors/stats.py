@@ -0,0 +1,12 @@
+from dataclasses import dataclass
+
+
+@dataclass
+class ExtractionStats:
+    num_pages: int = 0
+    num_cached_pages: int = 0
+    num_chunks: int = 0
+    num_tokens: int = 0
+    num_boilerplate_lines: int = 0
+    # Tokens of the removed boilerplate lines, never split nor embedded
+    num_tokens_saved: int = 0
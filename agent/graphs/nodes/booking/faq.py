@@ -10,7 +10,8 @@ from agent.embeddings.interface import IEmbeddingModel
 from agent.models.document import ScoredChunks
 from agent.models.messages import Messages, UserMessage
 from agent.models.stream import StreamChatData, StreamChunksData
-from agent.storages.vectordb.milvus import Milvus
+from agent.storages.vectordb.interface import IVectorStore
+from agent.text_splitters import ITextSplitter
 from .base import BaseNode
 from .models import State, Nodes
 
@@ -21,6 +22,13 @@ logger = logging.getLogger(__name__)
 @dataclass
 class FAQSettings:
     top_k: int = 10
+    mmr_lambda: float | None = None
+    mmr_fetch_k: int = 30
+    min_score: float | None = None
+    max_score_gap: float | None = None
+    # Estimated Jaccard similarity of word trigrams, see MinHash
+    near_duplicate_threshold: float | None = 0.7
+    context_token_budget: int | None = 6000
     temperature: float = 0.2
 
 
@@ -28,14 +36,16 @@ class FAQNode(BaseNode[State, Command[Literal[Nodes.END]]]):
     def __init__(
         self,
         chat_model: IChatModel,
-        vectordb: Milvus,
+        vectordb: IVectorStore,
         embedding_model: IEmbeddingModel,
+        text_splitter: ITextSplitter,
         prompt_template: Template,
         settings: FAQSettings | None = None,
     ) -> None:
         self.chat_model = chat_model
         self.vectodb = vectordb
         self.embedding_model = embedding_model
+        self.text_splitter = text_splitter
         self.prompt_template = prompt_template
         self.settings = settings or FAQSettings()
 
@@ -45,10 +55,30 @@ class FAQNode(BaseNode[State, Command[Literal[Nodes.END]]]):
         query_embedding = await self.embedding_model.aembedding(
             [str(state.query.content)]
         )
+        use_mmr = self.settings.mmr_lambda is not None
         chunks: ScoredChunks = await self.vectodb.search(
             query=query_embedding[0],
-            top_k=self.settings.top_k,
+            top_k=(
+                max(self.settings.top_k, self.settings.mmr_fetch_k)
+                if use_mmr
+                else self.settings.top_k
+            ),
+            min_score=self.settings.min_score,
+            with_embeddings=use_mmr,
         )
+        # The gap cutoff needs descending scores, MMR returns selection order
+        if self.settings.max_score_gap is not None:
+            chunks.cutoff_by_gap(self.settings.max_score_gap)
+        if self.settings.mmr_lambda is not None:
+            chunks.mmr(
+                query_embedding[0].embedding,
+                top_k=self.settings.top_k,
+                lambda_mult=self.settings.mmr_lambda,
+            )
+        if self.settings.near_duplicate_threshold is not None:
+            chunks.deduplicate(self.settings.near_duplicate_threshold)
+        if self.settings.context_token_budget is not None:
+            await chunks.apack(self.settings.context_token_budget, self.text_splitter)
 
         writer(StreamChunksData(data=chunks))
         prompt_content: str = self.prompt_template.render(
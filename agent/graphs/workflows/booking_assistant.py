@@ -60,6 +60,7 @@ class GraphDependencies:
             chat_model=self.container.chats.get("azure_openai"),
             vectordb=self.container.vectordbs.get("milvus"),
             embedding_model=self.container.embeddings.get("azure_openai"),
+            text_splitter=self.container.text_splitters.get("langchain"),
             prompt_template=self.booking_prompts.get("faq"),
         )
 
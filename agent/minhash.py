@@ -0,0 +1,101 @@
+import re
+from collections.abc import Sequence
+from hashlib import blake2b
+from typing import ClassVar
+
+import numpy as np
+import numpy.typing as npt
+
+
+class MinHash:
+    # Similarity is the Jaccard index of the sets of word trigrams of two
+    # texts, estimated as the share of equal signature values. With 200-word
+    # texts, changing 5 words gives about 0.85, changing 10 about 0.75 and
+    # unrelated texts about 0. The estimate has a standard error of about 0.03.
+    NUM_PERMUTATIONS: ClassVar[int] = 128
+    SHINGLE_SIZE: ClassVar[int] = 3
+    WORD_PATTERN: ClassVar[re.Pattern[str]] = re.compile(r"\w+")
+    # Share of pairs at exactly the threshold that end up compared
+    MIN_RECALL: ClassVar[float] = 0.99
+    # Fixed seeds, signatures stay comparable across calls and processes
+    SEEDS: ClassVar[npt.NDArray[np.uint64]] = np.random.default_rng(0).integers(
+        0, np.iinfo(np.uint64).max, size=NUM_PERMUTATIONS, dtype=np.uint64
+    )
+
+    @staticmethod
+    def mix(values: npt.NDArray[np.uint64]) -> npt.NDArray[np.uint64]:
+        # splitmix64 finalizer, one permutation of the 64-bit hashes per seed
+        values = (values ^ (values >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        values = (values ^ (values >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return values ^ (values >> np.uint64(31))
+
+    @classmethod
+    def signature(
+        cls, text: str, shingle_size: int = SHINGLE_SIZE
+    ) -> npt.NDArray[np.uint64]:
+        words = cls.WORD_PATTERN.findall(text.lower())
+        shingles = {
+            " ".join(words[idx : idx + shingle_size])
+            for idx in range(max(len(words) - shingle_size + 1, 1))
+        }
+        hashes = np.fromiter(
+            (
+                int.from_bytes(blake2b(shingle.encode(), digest_size=8).digest())
+                for shingle in shingles
+            ),
+            dtype=np.uint64,
+            count=len(shingles),
+        )
+
+        return cls.mix(hashes[:, np.newaxis] ^ cls.SEEDS).min(axis=0)
+
+    @staticmethod
+    def similarity(
+        signature: npt.NDArray[np.uint64], other: npt.NDArray[np.uint64]
+    ) -> float:
+        return float(np.mean(signature == other))
+
+    @classmethod
+    def bands(cls, threshold: float) -> tuple[int, int]:
+        # Number of bands and rows per band: the most rows (fewest spurious
+        # candidates) that still compare a pair at the threshold with
+        # probability MIN_RECALL
+        for rows in range(cls.NUM_PERMUTATIONS, 0, -1):
+            num_bands = cls.NUM_PERMUTATIONS // rows
+            if 1.0 - (1.0 - threshold**rows) ** num_bands >= cls.MIN_RECALL:
+                return num_bands, rows
+        return cls.NUM_PERMUTATIONS, 1
+
+    @classmethod
+    def unique(cls, texts: Sequence[str], threshold: float = 0.7) -> list[int]:
+        # Indices of texts whose similarity to every earlier kept text is below
+        # `threshold`. Candidates share at least one band of their signatures
+        # (LSH), so the run is linear in the number of texts.
+        if not 0.0 < threshold <= 1.0:
+            raise ValueError(f"threshold must be in (0, 1], got {threshold}")
+
+        num_bands, rows = cls.bands(threshold)
+        buckets: list[dict[bytes, list[int]]] = [{} for _ in range(num_bands)]
+        signatures: dict[int, npt.NDArray[np.uint64]] = {}
+        kept: list[int] = []
+        for idx, text in enumerate(texts):
+            signature = cls.signature(text)
+            bands = [
+                signature[band * rows : (band + 1) * rows].tobytes()
+                for band in range(num_bands)
+            ]
+
+            is_duplicate = any(
+                cls.similarity(signature, signatures[other]) >= threshold
+                for band, value in enumerate(bands)
+                for other in buckets[band].get(value, [])
+            )
+            if is_duplicate:
+                continue
+
+            kept.append(idx)
+            signatures[idx] = signature
+            for band, value in enumerate(bands):
+                buckets[band].setdefault(value, []).append(idx)
+
+        return kept
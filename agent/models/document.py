@@ -1,10 +1,16 @@
-import asyncio
+import heapq
+from collections.abc import Generator, Sequence
+from dataclasses import dataclass, field, replace
 from enum import StrEnum, auto
-from typing import Annotated, Literal, Self
-from uuid import UUID, uuid4
+from typing import Annotated, Any, ClassVar, Literal, Self
+from uuid import UUID, uuid4, uuid5
+import numpy as np
+import numpy.typing as npt
 from openai import BaseModel
-from pydantic import BeforeValidator, ConfigDict, Field, RootModel
+from pydantic import BeforeValidator, ConfigDict, Field, RootModel, TypeAdapter
 
+from agent.models.trusted import TrustedModels
+from agent.minhash import MinHash
 from agent.text_splitters import ITextSplitter, TextSplitterArguments
 
 
@@ -13,6 +19,11 @@ class Source(StrEnum):
     WEBSEARCH = auto()
 
 
+class FusionMethod(StrEnum):
+    RRF = auto()
+    SCORE = auto()
+
+
 class DocumentMetadata(BaseModel):
     model_config = ConfigDict(extra="allow")
     source: Literal[Source.DOCUMENT] = Source.DOCUMENT
@@ -36,14 +47,55 @@ Metadata = Annotated[
 
 
 class Chunk(BaseModel):
+    MetadataAdapter: ClassVar[TypeAdapter[Metadata]] = TypeAdapter(Metadata)
+    MetadataClasses: ClassVar[
+        dict[Source, type[DocumentMetadata] | type[WebsearchMetdata]]
+    ] = {
+        Source.DOCUMENT: DocumentMetadata,
+        Source.WEBSEARCH: WebsearchMetdata,
+    }
+
     chunk_id: UUID = Field(default_factory=uuid4)
     text: str
     metadata: Metadata
+    num_tokens: int | None = None
+
+    @classmethod
+    def from_trusted(
+        cls,
+        chunk_id: str | UUID,
+        text: str,
+        metadata: dict[str, Any],
+        num_tokens: int | None = None,
+    ) -> Self:
+        # For records written by our own indexing code (vector stores, batches)
+        if not TrustedModels.enabled:
+            return cls.model_validate(
+                {
+                    "chunk_id": chunk_id,
+                    "text": text,
+                    "metadata": cls.MetadataAdapter.validate_python(metadata),
+                    "num_tokens": num_tokens,
+                }
+            )
+
+        source = Source(metadata["source"])
+        return TrustedModels.model_construct(
+            cls,
+            chunk_id=chunk_id if isinstance(chunk_id, UUID) else UUID(chunk_id),
+            text=text,
+            metadata=TrustedModels.model_construct(
+                cls.MetadataClasses[source], **{**metadata, "source": source}
+            ),
+            num_tokens=num_tokens,
+        )
 
 
 class ScoredChunk(BaseModel):
     chunk: Chunk
     score: float
+    # Only returned on request (e.g. for MMR), never serialized to clients
+    embedding: list[float] | None = Field(default=None, exclude=True, repr=False)
 
     @property
     def text(self) -> str:
@@ -63,18 +115,15 @@ class ScoredChunks(RootModel[list[ScoredChunk]]):
         text_splitter: ITextSplitter,
         arguments: TextSplitterArguments | None = None,
     ) -> Self:
-        stripped_texts_list = await asyncio.gather(
-            *[
-                text_splitter.asplit_text(
-                    scored_chunk.text,
-                    arguments=arguments,
-                )
-                for scored_chunk in self.root
-            ]
+        arguments = arguments or TextSplitterArguments()
+        stripped_texts = await text_splitter.atruncate_texts(
+            [scored_chunk.text for scored_chunk in self.root],
+            max_tokens=arguments.chunk_size,
+            arguments=arguments,
         )
 
-        for scored_chunk, stripped_texts in zip(self.root, stripped_texts_list):
-            scored_chunk.chunk.text = stripped_texts[0]
+        for scored_chunk, stripped_text in zip(self.root, stripped_texts):
+            scored_chunk.chunk.text = stripped_text
 
         return self
 
@@ -86,6 +135,116 @@ class ScoredChunks(RootModel[list[ScoredChunk]]):
         self.root = self.root[:topk]
         return self
 
+    def top(self, topk: int) -> Self:
+        # Partial heap selection, cheaper than sort().limit() when topk << len
+        self.root = heapq.nlargest(topk, self.root, key=lambda x: x.score)
+        return self
+
+    def cutoff_by_gap(self, max_gap: float, min_k: int = 1) -> Self:
+        # Expects chunks sorted by descending score; drops everything after
+        # the first drop larger than `max_gap` between neighbouring scores.
+        for idx in range(max(min_k, 1), len(self.root)):
+            if self.root[idx - 1].score - self.root[idx].score > max_gap:
+                self.root = self.root[:idx]
+                break
+        return self
+
+    def deduplicate(self, threshold: float = 0.7) -> Self:
+        # Keeps the highest-scoring chunk among near-duplicates (MinHash
+        # similarity >= threshold), in descending score order.
+        self.sort()
+        kept = MinHash.unique(
+            [scored_chunk.text for scored_chunk in self.root], threshold=threshold
+        )
+        self.root = [self.root[idx] for idx in kept]
+        return self
+
+    async def apack(
+        self,
+        token_budget: int,
+        text_splitter: ITextSplitter,
+        arguments: TextSplitterArguments | None = None,
+        min_truncated_tokens: int = 64,
+    ) -> Self:
+        # Token counts are normally stored with the chunk at index time, only
+        # chunks without one (e.g. websearch results) are counted here.
+        uncounted = [
+            scored_chunk.chunk
+            for scored_chunk in self.root
+            if scored_chunk.chunk.num_tokens is None
+        ]
+        if uncounted:
+            counts = await text_splitter.acount_tokens(
+                [chunk.text for chunk in uncounted], arguments=arguments
+            )
+            for chunk, num_tokens in zip(uncounted, counts):
+                chunk.num_tokens = num_tokens
+
+        packed: list[ScoredChunk] = []
+        remaining = token_budget
+        for scored_chunk in self.sort().root:
+            num_tokens = scored_chunk.chunk.num_tokens or 0
+            if num_tokens <= remaining:
+                packed.append(scored_chunk)
+                remaining -= num_tokens
+                continue
+
+            if remaining >= min_truncated_tokens:
+                truncated_texts = await text_splitter.atruncate_texts(
+                    [scored_chunk.text], max_tokens=remaining, arguments=arguments
+                )
+                truncated_chunk = scored_chunk.chunk.model_copy(
+                    update={"text": truncated_texts[0], "num_tokens": remaining}
+                )
+                packed.append(
+                    scored_chunk.model_copy(update={"chunk": truncated_chunk})
+                )
+            break
+
+        self.root = packed
+        return self
+
+    def mmr(
+        self,
+        query_embedding: Sequence[float],
+        top_k: int,
+        lambda_mult: float = 0.5,
+    ) -> Self:
+        # Maximal marginal relevance: greedily pick the chunk maximizing
+        # lambda * sim(query, chunk) - (1 - lambda) * max sim(chunk, selected)
+        if len(self.root) == 0:
+            return self
+        if any(scored_chunk.embedding is None for scored_chunk in self.root):
+            raise ValueError("MMR requires chunks retrieved with their embeddings")
+
+        vectors = np.asarray(
+            [scored_chunk.embedding for scored_chunk in self.root], dtype=np.float32
+        )
+        vectors /= np.maximum(
+            np.linalg.norm(vectors, axis=1, keepdims=True), np.finfo(np.float32).eps
+        )
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query /= max(float(np.linalg.norm(query)), float(np.finfo(np.float32).eps))
+
+        relevance = vectors @ query
+        similarity = vectors @ vectors.T
+
+        selected = [int(np.argmax(relevance))]
+        is_selected = np.zeros(len(self.root), dtype=np.bool_)
+        is_selected[selected[0]] = True
+        max_similarity = similarity[selected[0]].copy()
+        while len(selected) < min(top_k, len(self.root)):
+            mmr_scores = lambda_mult * relevance - (1 - lambda_mult) * max_similarity
+            mmr_scores[is_selected] = -np.inf
+
+            idx = int(np.argmax(mmr_scores))
+            selected.append(idx)
+            is_selected[idx] = True
+            np.maximum(max_similarity, similarity[idx], out=max_similarity)
+
+        self.root = [self.root[idx] for idx in selected]
+        return self
+
     @property
     def context(self) -> str:
         contexts: list[str] = []
@@ -105,7 +264,169 @@ class ScoredChunks(RootModel[list[ScoredChunk]]):
             self.root.extend(other.root)
         return self
 
+    def fused_scores(
+        self, method: FusionMethod = FusionMethod.RRF, rrf_k: int = 60
+    ) -> list[float]:
+        match method:
+            case FusionMethod.RRF:
+                ranks = sorted(
+                    range(len(self.root)),
+                    key=lambda idx: self.root[idx].score,
+                    reverse=True,
+                )
+                scores = [0.0] * len(self.root)
+                for rank, idx in enumerate(ranks, start=1):
+                    scores[idx] = 1.0 / (rrf_k + rank)
+                return scores
+            case FusionMethod.SCORE:
+                if len(self.root) == 0:
+                    return []
+                raw_scores = [scored_chunk.score for scored_chunk in self.root]
+                low, high = min(raw_scores), max(raw_scores)
+                if high == low:
+                    return [1.0] * len(raw_scores)
+                return [(score - low) / (high - low) for score in raw_scores]
+
+    @classmethod
+    def fuse(
+        cls,
+        rankings: Sequence["ScoredChunks"],
+        top_k: int,
+        method: FusionMethod = FusionMethod.RRF,
+        rrf_k: int = 60,
+    ) -> Self:
+        # Scores from different sources are not comparable, so each ranking is
+        # turned into per-source fused scores which are summed per chunk.
+        fused: dict[UUID, ScoredChunk] = {}
+        for ranking in rankings:
+            for scored_chunk, score in zip(
+                ranking.root, ranking.fused_scores(method, rrf_k)
+            ):
+                chunk_id = scored_chunk.chunk.chunk_id
+                if chunk_id in fused:
+                    fused[chunk_id].score += score
+                else:
+                    fused[chunk_id] = scored_chunk.model_copy(update={"score": score})
+
+        return cls(list(fused.values())).top(top_k)
+
 
 class Document(BaseModel):
     filename: Annotated[str, BeforeValidator(lambda _input: str(_input))]
     chunks: list[Chunk]
+
+
+@dataclass
+class ChunkBatch:
+    # Column-oriented chunks for the indexing path: no pydantic object is built
+    # per chunk unless one is explicitly asked for via `chunk`/`iter_chunks`.
+    CHUNK_ID_NAMESPACE: ClassVar[UUID] = UUID("6f1c3d2e-8a4b-5c7d-9e0f-1a2b3c4d5e6f")
+
+    chunk_ids: list[str]
+    texts: list[str]
+    num_tokens: list[int | None]
+    metadata: dict[str, list[Any]] = field(default_factory=dict)
+    embeddings: npt.NDArray[np.float32] | None = None
+
+    def __post_init__(self) -> None:
+        lengths = {
+            len(self.chunk_ids),
+            len(self.texts),
+            len(self.num_tokens),
+            *(len(column) for column in self.metadata.values()),
+        }
+        if self.embeddings is not None:
+            lengths.add(len(self.embeddings))
+        if len(lengths) > 1:
+            raise ValueError(f"ChunkBatch columns have different lengths: {lengths}")
+
+    def __len__(self) -> int:
+        return len(self.chunk_ids)
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: list[str],
+        num_tokens: list[int | None] | None = None,
+        metadata: dict[str, list[Any]] | None = None,
+        chunk_ids: list[str] | None = None,
+    ) -> Self:
+        return cls(
+            chunk_ids=chunk_ids or [str(uuid4()) for _ in texts],
+            texts=texts,
+            num_tokens=num_tokens or [None] * len(texts),
+            metadata=metadata or {},
+        )
+
+    @classmethod
+    def chunk_id_of(cls, *parts: str | int) -> str:
+        # The same chunk of the same document always gets the same id, so
+        # re-indexing it overwrites instead of duplicating
+        return str(uuid5(cls.CHUNK_ID_NAMESPACE, ":".join(map(str, parts))))
+
+    @classmethod
+    def from_chunks(cls, chunks: Sequence[Chunk]) -> Self:
+        metadata: dict[str, list[Any]] = {}
+        for idx, chunk in enumerate(chunks):
+            for key, value in chunk.metadata.model_dump().items():
+                metadata.setdefault(key, [None] * len(chunks))[idx] = value
+
+        return cls(
+            chunk_ids=[str(chunk.chunk_id) for chunk in chunks],
+            texts=[chunk.text for chunk in chunks],
+            num_tokens=[chunk.num_tokens for chunk in chunks],
+            metadata=metadata,
+        )
+
+    @classmethod
+    def concat(cls, batches: Sequence["ChunkBatch"]) -> Self:
+        keys = {key for batch in batches for key in batch.metadata}
+        embeddings = [
+            batch.embeddings for batch in batches if batch.embeddings is not None
+        ]
+        return cls(
+            chunk_ids=[idx for batch in batches for idx in batch.chunk_ids],
+            texts=[text for batch in batches for text in batch.texts],
+            num_tokens=[num for batch in batches for num in batch.num_tokens],
+            metadata={
+                key: [
+                    value
+                    for batch in batches
+                    for value in batch.metadata.get(key, [None] * len(batch))
+                ]
+                for key in keys
+            },
+            embeddings=(
+                np.concatenate(embeddings)
+                if batches and len(embeddings) == len(batches)
+                else None
+            ),
+        )
+
+    def with_embeddings(self, embeddings: npt.NDArray[np.float32]) -> Self:
+        return replace(self, embeddings=embeddings)
+
+    def slice(self, start: int, end: int) -> Self:
+        return replace(
+            self,
+            chunk_ids=self.chunk_ids[start:end],
+            texts=self.texts[start:end],
+            num_tokens=self.num_tokens[start:end],
+            metadata={key: column[start:end] for key, column in self.metadata.items()},
+            embeddings=None if self.embeddings is None else self.embeddings[start:end],
+        )
+
+    def metadata_row(self, idx: int) -> dict[str, Any]:
+        return {key: column[idx] for key, column in self.metadata.items()}
+
+    def chunk(self, idx: int) -> Chunk:
+        return Chunk.from_trusted(
+            chunk_id=self.chunk_ids[idx],
+            text=self.texts[idx],
+            metadata=self.metadata_row(idx),
+            num_tokens=self.num_tokens[idx],
+        )
+
+    def iter_chunks(self) -> Generator[Chunk, None, None]:
+        for idx in range(len(self)):
+            yield self.chunk(idx)
@@ -0,0 +1,42 @@
+from collections.abc import Generator
+from contextlib import contextmanager
+from typing import Any, ClassVar
+
+from pydantic import BaseModel
+
+
+class TrustedModels:
+    # When enabled, data produced by our own code or a trusted SDK is turned
+    # into models with `model_construct`, skipping validation on hot paths.
+    # Anything coming from users or external services must still be validated.
+    # Off until `benchmarks/trusted_models.py` shows a gain on the hot paths,
+    # `Container` sets it from the `trusted_models` setting.
+    enabled: ClassVar[bool] = False
+
+    @classmethod
+    @contextmanager
+    def override(cls, enabled: bool) -> Generator[None, None, None]:
+        previous = cls.enabled
+        cls.enabled = enabled
+        try:
+            yield
+        finally:
+            cls.enabled = previous
+
+    @classmethod
+    def construct[ModelT: BaseModel](
+        cls, model_cls: type[ModelT], **data: Any
+    ) -> ModelT:
+        if cls.enabled:
+            return cls.model_construct(model_cls, **data)
+        return model_cls.model_validate(data)
+
+    @staticmethod
+    def model_construct[ModelT: BaseModel](
+        model_cls: type[ModelT], **data: Any
+    ) -> ModelT:
+        # openai's BaseModel overrides `model_construct` with a recursive
+        # conversion that re-checks every union, slower than validating;
+        # pydantic's own implementation only assigns the fields.
+        construct: classmethod[Any, Any, ModelT] = vars(BaseModel)["model_construct"]
+        return construct.__get__(None, model_cls)(**data)
@@ -0,0 +1,27 @@
+from .indexing import (
+    IndexingJob,
+    IndexingPipeline,
+    IndexingPipelineSettings,
+    IndexingReport,
+    StageStats,
+)
+from .jobqueue import JobQueue, JobQueueSettings, QueuedJob
+from .manifest import FileProgress, IndexingManifest, ManifestSummary, PageStage
+from .worker import IndexingWorker
+
+
+__all__ = [
+    "FileProgress",
+    "IndexingJob",
+    "IndexingManifest",
+    "IndexingPipeline",
+    "IndexingPipelineSettings",
+    "IndexingReport",
+    "IndexingWorker",
+    "JobQueue",
+    "JobQueueSettings",
+    "ManifestSummary",
+    "PageStage",
+    "QueuedJob",
+    "StageStats",
+]
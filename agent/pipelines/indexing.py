@@ -0,0 +1,328 @@
+import asyncio
+import logging
+import time
+from collections.abc import AsyncGenerator, Callable, Collection, Coroutine, Iterable
+from dataclasses import dataclass, field
+from typing import Any
+
+from pydantic import BaseModel
+
+from agent.embeddings import IEmbeddingModel
+from agent.extractors import (
+    DocumentInput,
+    DocumentSource,
+    ExtractedPages,
+    ExtractionStats,
+    IExtractor,
+)
+from agent.models.document import ChunkBatch
+from agent.storages.vectordb import IVectorStore
+
+from .manifest import IndexingManifest, PageStage
+
+
+logger = logging.getLogger(__name__)
+
+
+class IndexingPipelineSettings(BaseModel):
+    # Files extracted concurrently; each also uses the extractor's workers
+    number_extract_workers: int = 2
+    number_split_workers: int = 2
+    number_embed_workers: int = 4
+    number_insert_workers: int = 2
+    # Items buffered between two stages before the upstream stage waits
+    queue_size: int = 8
+    report_interval: float = 5.0
+
+
+@dataclass
+class IndexingJob:
+    source: DocumentInput
+    # Required for in-memory sources, see `IExtractor.aiter_pages`
+    document_key: str | None = None
+    # Only these (1-based) pages, the whole document when unset
+    pageidxs: Collection[int] | None = None
+
+
+@dataclass
+class StageStats:
+    name: str
+    # What the stage outputs, pages for extraction and chunks afterwards
+    unit: str = "chunks"
+    num_items: int = 0
+    num_units: int = 0
+    # Sum over the stage workers of the time spent processing items
+    busy_seconds: float = 0.0
+    start_time: float = field(default_factory=time.perf_counter)
+    end_time: float | None = None
+
+    @property
+    def elapsed_seconds(self) -> float:
+        return (self.end_time or time.perf_counter()) - self.start_time
+
+    @property
+    def units_per_second(self) -> float:
+        return self.num_units / max(self.elapsed_seconds, 1e-9)
+
+    def __str__(self) -> str:
+        return (
+            f"{self.name}: {self.num_units} {self.unit} "
+            f"({self.units_per_second:.1f}/s, busy {self.busy_seconds:.1f}s)"
+        )
+
+
+@dataclass
+class IndexingReport:
+    stages: dict[str, StageStats]
+    extraction: ExtractionStats
+
+    @property
+    def num_chunks(self) -> int:
+        return self.stages["insert"].num_units
+
+
+# Marks the end of a stage's input
+_DONE = object()
+
+
+class IndexingPipeline:
+    # extract -> split -> embed -> insert, connected by bounded queues so a
+    # slow stage applies backpressure instead of buffering the whole corpus.
+    def __init__(
+        self,
+        extractor: IExtractor,
+        embedding_model: IEmbeddingModel,
+        vectordb: IVectorStore,
+        settings: IndexingPipelineSettings | None = None,
+        manifest: IndexingManifest | None = None,
+    ) -> None:
+        self.extractor = extractor
+        self.embedding_model = embedding_model
+        self.vectordb = vectordb
+        self.settings = settings or IndexingPipelineSettings()
+        # Without a manifest every run indexes every page again
+        self.manifest = manifest
+
+    async def _extract(
+        self, job: IndexingJob, stats: ExtractionStats
+    ) -> AsyncGenerator[ExtractedPages | ChunkBatch, None]:
+        manifest = self.manifest
+        content_hash = None
+        if manifest is not None:
+            content_hash = await asyncio.to_thread(manifest.fingerprint, job.source)
+        if manifest is None or content_hash is None:
+            async for pages in self.extractor.aiter_pages(
+                job.source,
+                document_key=job.document_key,
+                stats=stats,
+                pageidxs=job.pageidxs,
+            ):
+                yield pages
+            return
+
+        document_key = DocumentSource.key_of(job.source, job.document_key)
+        num_pages = await self.extractor.acount_pages(
+            job.source, document_key=job.document_key
+        )
+        progress = await asyncio.to_thread(
+            manifest.begin, document_key, content_hash, num_pages
+        )
+        if progress.removed_pageidxs:
+            removed_pageidxs: list[str | int] = [*progress.removed_pageidxs]
+            await self.vectordb.delete(
+                {"filename": [document_key], "pageidx": removed_pageidxs}
+            )
+
+        stages = progress.stages
+        if job.pageidxs is not None:
+            stages = {
+                pageidx: stages[pageidx]
+                for pageidx in job.pageidxs
+                if pageidx in stages
+            }
+
+        # Chunks embedded by an interrupted run skip splitting and embedding
+        embedded = await asyncio.to_thread(
+            manifest.load_embedded, document_key, stages.keys()
+        )
+        if embedded is not None:
+            yield embedded
+
+        pageidxs = [
+            pageidx for pageidx, stage in stages.items() if stage < PageStage.EMBEDDED
+        ]
+        if not pageidxs:
+            logger.info(f"Skipping {document_key}, already indexed")
+            return
+
+        async for pages in self.extractor.aiter_pages(
+            job.source, document_key=job.document_key, stats=stats, pageidxs=pageidxs
+        ):
+            await asyncio.to_thread(
+                manifest.mark,
+                pages.document_key,
+                [page.pageidx for page in pages.pages],
+                PageStage.EXTRACTED,
+            )
+            yield pages
+
+    async def _purge(self, pages: set[tuple[str, int]]) -> None:
+        # Chunks of an older version of these pages; the new version may have
+        # fewer chunks, which the upsert alone would leave behind
+        if self.manifest is None or not pages:
+            return
+        to_purge = await asyncio.to_thread(self.manifest.pages_to_purge, pages)
+        for document_key, pageidxs in to_purge.items():
+            await self.vectordb.delete(
+                {"filename": [document_key], "pageidx": sorted(pageidxs)}
+            )
+
+    async def _split(
+        self, pages: ExtractedPages | ChunkBatch, stats: ExtractionStats
+    ) -> AsyncGenerator[ChunkBatch, None]:
+        if isinstance(pages, ChunkBatch):
+            yield pages
+            return
+
+        batch = await self.extractor.abatch_pages(pages, stats=stats)
+        if self.manifest is not None:
+            # Pages without any chunk have nothing left to do
+            empty_pageidxs = {page.pageidx for page in pages.pages} - set(
+                batch.metadata.get("pageidx", [])
+            )
+            await self._purge({(pages.document_key, idx) for idx in empty_pageidxs})
+            await asyncio.to_thread(
+                self.manifest.mark,
+                pages.document_key,
+                empty_pageidxs,
+                PageStage.INSERTED,
+            )
+        if len(batch) > 0:
+            yield batch
+
+    async def _embed(self, batch: ChunkBatch) -> AsyncGenerator[ChunkBatch, None]:
+        if batch.embeddings is None:
+            batch = batch.with_embeddings(
+                await self.embedding_model.aembedding_vectors(batch.texts)
+            )
+            if self.manifest is not None:
+                await asyncio.to_thread(self.manifest.save_embedded, batch)
+        yield batch
+
+    async def _insert(self, batch: ChunkBatch) -> AsyncGenerator[ChunkBatch, None]:
+        # Chunk ids are deterministic, so a batch inserted again after a crash
+        # between the insert and its bookkeeping replaces its own rows
+        if self.manifest is not None:
+            await self._purge(self.manifest.pages_of(batch))
+        await self.vectordb.add_batch(batch)
+        if self.manifest is not None:
+            await asyncio.to_thread(self.manifest.mark_inserted, batch)
+        yield batch
+
+    async def _run_stage(
+        self,
+        stats: StageStats,
+        handler: Callable[[Any], AsyncGenerator[Any, None]],
+        inqueue: asyncio.Queue[Any],
+        outqueue: asyncio.Queue[Any] | None,
+        num_workers: int,
+        num_downstream_workers: int = 0,
+    ) -> None:
+        async def work() -> None:
+            while (item := await inqueue.get()) is not _DONE:
+                start_time = time.perf_counter()
+                async for output in handler(item):
+                    # Time spent waiting on a full downstream queue is not work
+                    stats.busy_seconds += time.perf_counter() - start_time
+                    stats.num_units += len(output)
+                    if outqueue is not None:
+                        await outqueue.put(output)
+                    start_time = time.perf_counter()
+                stats.busy_seconds += time.perf_counter() - start_time
+                stats.num_items += 1
+
+        async with asyncio.TaskGroup() as group:
+            for _ in range(num_workers):
+                group.create_task(work())
+
+        # One end marker for every worker of the next stage
+        stats.end_time = time.perf_counter()
+        if outqueue is not None:
+            for _ in range(num_downstream_workers):
+                await outqueue.put(_DONE)
+
+    async def _report(self, stages: dict[str, StageStats]) -> None:
+        while True:
+            await asyncio.sleep(self.settings.report_interval)
+            logger.info(" | ".join(str(stats) for stats in stages.values()))
+
+    async def arun(self, jobs: Iterable[IndexingJob]) -> IndexingReport:
+        settings = self.settings
+        extraction_stats = ExtractionStats()
+        stages = {
+            "extract": StageStats("extract", unit="pages"),
+            "split": StageStats("split"),
+            "embed": StageStats("embed"),
+            "insert": StageStats("insert"),
+        }
+        queues: list[asyncio.Queue[Any]] = [
+            asyncio.Queue(maxsize=settings.queue_size) for _ in range(4)
+        ]
+
+        async def feed() -> None:
+            for job in jobs:
+                await queues[0].put(job)
+            for _ in range(settings.number_extract_workers):
+                await queues[0].put(_DONE)
+
+        def with_stats(
+            handler: Callable[[Any, ExtractionStats], AsyncGenerator[Any, None]],
+        ) -> Callable[[Any], AsyncGenerator[Any, None]]:
+            return lambda item: handler(item, extraction_stats)
+
+        stage_runs: list[Coroutine[Any, Any, None]] = [
+            self._run_stage(
+                stages["extract"],
+                with_stats(self._extract),
+                queues[0],
+                queues[1],
+                settings.number_extract_workers,
+                settings.number_split_workers,
+            ),
+            self._run_stage(
+                stages["split"],
+                with_stats(self._split),
+                queues[1],
+                queues[2],
+                settings.number_split_workers,
+                settings.number_embed_workers,
+            ),
+            self._run_stage(
+                stages["embed"],
+                self._embed,
+                queues[2],
+                queues[3],
+                settings.number_embed_workers,
+                settings.number_insert_workers,
+            ),
+            self._run_stage(
+                stages["insert"],
+                self._insert,
+                queues[3],
+                None,
+                settings.number_insert_workers,
+            ),
+        ]
+
+        reporter = asyncio.create_task(self._report(stages))
+        try:
+            async with asyncio.TaskGroup() as group:
+                group.create_task(feed())
+                for stage_run in stage_runs:
+                    group.create_task(stage_run)
+        finally:
+            reporter.cancel()
+
+        report = IndexingReport(stages=stages, extraction=extraction_stats)
+        logger.info(" | ".join(str(stats) for stats in stages.values()))
+        return report
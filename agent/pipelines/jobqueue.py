@@ -0,0 +1,202 @@
+import sqlite3
+import time
+from collections.abc import Generator
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Literal
+
+from pydantic import BaseModel
+
+
+JobStatus = Literal["pending", "leased", "done", "failed"]
+
+
+class JobQueueSettings(BaseModel):
+    # A lease not renewed for this long is considered abandoned and reclaimed
+    lease_seconds: float = 120.0
+    heartbeat_interval: float = 30.0
+    # Attempts per job before it is marked as failed
+    max_attempts: int = 3
+    # How long an idle worker waits before looking for work again
+    poll_interval: float = 5.0
+
+
+@dataclass
+class QueuedJob:
+    job_id: int
+    filepath: Path
+    # Inclusive 1-based page range, the whole file when unset
+    page_start: int | None = None
+    page_end: int | None = None
+    attempts: int = 0
+
+    @property
+    def pageidxs(self) -> range | None:
+        if self.page_start is None or self.page_end is None:
+            return None
+        return range(self.page_start, self.page_end + 1)
+
+    def __str__(self) -> str:
+        if self.page_start is None:
+            return str(self.filepath)
+        return f"{self.filepath} [{self.page_start}-{self.page_end}]"
+
+
+class JobQueue:
+    # Indexing jobs shared by worker processes. A claimed job is leased to
+    # one worker, which renews the lease while it works; a job whose lease
+    # expired (crashed or stuck worker) is handed to the next claimer. The
+    # database must be on a local or lock-correct filesystem for workers
+    # on several nodes.
+    def __init__(self, dbpath: Path, settings: JobQueueSettings | None = None) -> None:
+        self.dbpath = dbpath
+        self.settings = settings or JobQueueSettings()
+        self.dbpath.parent.mkdir(parents=True, exist_ok=True)
+        # Outside of a transaction, the journal mode cannot change in one
+        conn = sqlite3.connect(self.dbpath, timeout=30)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+        finally:
+            conn.close()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "job_id INTEGER PRIMARY KEY AUTOINCREMENT, filepath TEXT NOT NULL, "
+                "page_start INTEGER, page_end INTEGER, "
+                "status TEXT NOT NULL DEFAULT 'pending', worker_id TEXT, "
+                "lease_expires REAL, attempts INTEGER NOT NULL DEFAULT 0, error TEXT, "
+                "UNIQUE (filepath, page_start, page_end))"
+            )
+            # SQLite tells NULLs apart in unique constraints, whole-file jobs
+            # need their own index to be enqueued once. Duplicates left by
+            # earlier versions are dropped first, the oldest job is kept.
+            conn.execute(
+                "DELETE FROM jobs WHERE page_start IS NULL AND job_id NOT IN ("
+                "SELECT MIN(job_id) FROM jobs WHERE page_start IS NULL "
+                "GROUP BY filepath)"
+            )
+            conn.execute(
+                "CREATE UNIQUE INDEX IF NOT EXISTS jobs_pages ON jobs "
+                "(filepath, COALESCE(page_start, 0), COALESCE(page_end, 0))"
+            )
+
+    @contextmanager
+    def _connect(self) -> Generator[sqlite3.Connection, None, None]:
+        conn = sqlite3.connect(self.dbpath, timeout=30, isolation_level=None)
+        try:
+            # Taking the write lock upfront makes claims atomic across processes
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+
+    def enqueue(
+        self,
+        filepath: Path,
+        num_pages: int | None = None,
+        pages_per_job: int | None = None,
+    ) -> int:
+        # One job per file, or per `pages_per_job` pages when the page count
+        # is known. Enqueuing the same job twice is a no-op.
+        page_ranges: list[tuple[int | None, int | None]] = [(None, None)]
+        if num_pages is not None and pages_per_job is not None:
+            page_ranges = [
+                (start, min(start + pages_per_job - 1, num_pages))
+                for start in range(1, num_pages + 1, pages_per_job)
+            ]
+
+        with self._connect() as conn:
+            cursor = conn.executemany(
+                "INSERT OR IGNORE INTO jobs (filepath, page_start, page_end) "
+                "VALUES (?, ?, ?)",
+                ((str(filepath), start, end) for start, end in page_ranges),
+            )
+        return cursor.rowcount
+
+    def claim(self, worker_id: str) -> QueuedJob | None:
+        now = time.time()
+        with self._connect() as conn:
+            # A job that keeps killing its workers is not retried forever
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', error = 'Lease expired' "
+                "WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?",
+                (now, self.settings.max_attempts),
+            )
+            row = conn.execute(
+                "SELECT job_id, filepath, page_start, page_end, attempts FROM jobs "
+                "WHERE status = 'pending' "
+                "OR (status = 'leased' AND lease_expires < ?) "
+                "ORDER BY job_id LIMIT 1",
+                (now,),
+            ).fetchone()
+            if row is None:
+                return None
+
+            job = QueuedJob(
+                job_id=row[0],
+                filepath=Path(row[1]),
+                page_start=row[2],
+                page_end=row[3],
+                attempts=row[4] + 1,
+            )
+            conn.execute(
+                "UPDATE jobs SET status = 'leased', worker_id = ?, "
+                "lease_expires = ?, attempts = ? WHERE job_id = ?",
+                (
+                    worker_id,
+                    now + self.settings.lease_seconds,
+                    job.attempts,
+                    job.job_id,
+                ),
+            )
+        return job
+
+    def heartbeat(self, job: QueuedJob, worker_id: str) -> bool:
+        # False when the lease was lost, the job then belongs to another worker
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET lease_expires = ? "
+                "WHERE job_id = ? AND worker_id = ? AND status = 'leased'",
+                (time.time() + self.settings.lease_seconds, job.job_id, worker_id),
+            )
+        return cursor.rowcount == 1
+
+    def complete(self, job: QueuedJob, worker_id: str) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'done', lease_expires = NULL, error = NULL "
+                "WHERE job_id = ? AND worker_id = ?",
+                (job.job_id, worker_id),
+            )
+
+    def fail(self, job: QueuedJob, worker_id: str, error: str) -> None:
+        status: JobStatus = (
+            "failed" if job.attempts >= self.settings.max_attempts else "pending"
+        )
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, lease_expires = NULL, error = ? "
+                "WHERE job_id = ? AND worker_id = ?",
+                (status, error, job.job_id, worker_id),
+            )
+
+    def has_work(self) -> bool:
+        # Leased jobs count: their worker may crash and leave them to us
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT 1 FROM jobs WHERE status IN ('pending', 'leased') LIMIT 1"
+            ).fetchone()
+        return row is not None
+
+    def summary(self) -> dict[JobStatus, int]:
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT status, COUNT(*) FROM jobs GROUP BY status"
+            ).fetchall()
+        return dict(rows)
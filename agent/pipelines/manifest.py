@@ -0,0 +1,285 @@
+import hashlib
+import json
+import sqlite3
+import time
+from collections.abc import Collection, Generator, Iterable
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from enum import IntEnum
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+from agent.extractors import DocumentInput
+from agent.models.document import ChunkBatch
+
+
+class PageStage(IntEnum):
+    PENDING = 0
+    EXTRACTED = 1
+    EMBEDDED = 2
+    INSERTED = 3
+
+
+@dataclass
+class FileProgress:
+    stages: dict[int, PageStage]
+    # Pages of a previous version of the file beyond its current last page
+    removed_pageidxs: list[int] = field(default_factory=list)
+
+
+@dataclass
+class ManifestSummary:
+    num_files: int = 0
+    num_complete_files: int = 0
+    num_pages: dict[PageStage, int] = field(default_factory=dict)
+    incomplete_files: list[str] = field(default_factory=list)
+    # Embedded chunks waiting to be inserted, reused on the next run
+    num_pending_chunks: int = 0
+
+    @property
+    def num_remaining_pages(self) -> int:
+        return sum(
+            num for stage, num in self.num_pages.items() if stage < PageStage.INSERTED
+        )
+
+    def __str__(self) -> str:
+        pages = ", ".join(
+            f"{self.num_pages.get(stage, 0)} {stage.name.lower()}"
+            for stage in PageStage
+        )
+        return (
+            f"{self.num_complete_files}/{self.num_files} files complete, "
+            f"{self.num_remaining_pages} pages remaining ({pages}), "
+            f"{self.num_pending_chunks} embedded chunks not inserted"
+        )
+
+
+class IndexingManifest:
+    # Per file and per page progress of the indexing pipeline, so an
+    # interrupted run resumes where it stopped. Embeddings are kept until
+    # their chunks are inserted and are never computed twice.
+    def __init__(self, dbpath: Path) -> None:
+        self.dbpath = dbpath
+        self.dbpath.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS files ("
+                "document_key TEXT PRIMARY KEY, content_hash TEXT NOT NULL, "
+                "num_pages INTEGER NOT NULL, updated_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS pages ("
+                "document_key TEXT NOT NULL, pageidx INTEGER NOT NULL, "
+                "stage INTEGER NOT NULL, "
+                # Set while chunks of an older version of the page may remain
+                # in the vector store
+                "purge INTEGER NOT NULL DEFAULT 0, "
+                "PRIMARY KEY (document_key, pageidx))"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS pending_chunks ("
+                "chunk_id TEXT PRIMARY KEY, document_key TEXT NOT NULL, "
+                "pageidx INTEGER NOT NULL, text TEXT NOT NULL, num_tokens INTEGER, "
+                "metadata TEXT NOT NULL, embedding BLOB NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS pending_chunks_document "
+                "ON pending_chunks (document_key)"
+            )
+
+    @contextmanager
+    def _connect(self) -> Generator[sqlite3.Connection, None, None]:
+        conn = sqlite3.connect(self.dbpath, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def fingerprint(source: DocumentInput) -> str | None:
+        # Streamed documents can only be read once, they are not tracked
+        digest = hashlib.sha256()
+        if isinstance(source, Path):
+            with open(source, "rb") as f:
+                while chunk := f.read(1 << 20):
+                    digest.update(chunk)
+        elif isinstance(source, (bytes, memoryview)):
+            digest.update(source)
+        else:
+            return None
+        return digest.hexdigest()
+
+    def begin(
+        self, document_key: str, content_hash: str, num_pages: int
+    ) -> FileProgress:
+        # Progress of a file whose content changed is discarded and its pages
+        # are purged from the vector store before their new chunks go in.
+        # Workers may begin the same file concurrently, the check and reset
+        # are atomic.
+        removed_pageidxs: list[int] = []
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT content_hash, num_pages FROM files WHERE document_key = ?",
+                (document_key,),
+            ).fetchone()
+            if row != (content_hash, num_pages):
+                if row is not None:
+                    removed_pageidxs = list(range(num_pages + 1, row[1] + 1))
+                conn.execute(
+                    "DELETE FROM pages WHERE document_key = ?", (document_key,)
+                )
+                conn.execute(
+                    "DELETE FROM pending_chunks WHERE document_key = ?",
+                    (document_key,),
+                )
+                conn.executemany(
+                    "INSERT INTO pages (document_key, pageidx, stage, purge) "
+                    "VALUES (?, ?, ?, 1)",
+                    (
+                        (document_key, pageidx, PageStage.PENDING)
+                        for pageidx in range(1, num_pages + 1)
+                    ),
+                )
+            conn.execute(
+                "INSERT INTO files (document_key, content_hash, num_pages, updated_at) "
+                "VALUES (?, ?, ?, ?) ON CONFLICT(document_key) DO UPDATE SET "
+                "content_hash = excluded.content_hash, "
+                "num_pages = excluded.num_pages, updated_at = excluded.updated_at",
+                (document_key, content_hash, num_pages, time.time()),
+            )
+            rows = conn.execute(
+                "SELECT pageidx, stage FROM pages WHERE document_key = ?",
+                (document_key,),
+            ).fetchall()
+        return FileProgress(
+            stages={pageidx: PageStage(stage) for pageidx, stage in rows},
+            removed_pageidxs=removed_pageidxs,
+        )
+
+    def mark(
+        self, document_key: str, pageidxs: Iterable[int], stage: PageStage
+    ) -> None:
+        with self._connect() as conn:
+            self._mark_pages(
+                conn, {(document_key, pageidx) for pageidx in pageidxs}, stage
+            )
+
+    @staticmethod
+    def pages_of(batch: ChunkBatch) -> set[tuple[str, int]]:
+        return set(zip(batch.metadata["filename"], batch.metadata["pageidx"]))
+
+    def _mark_pages(
+        self, conn: sqlite3.Connection, pages: set[tuple[str, int]], stage: PageStage
+    ) -> None:
+        # Stages only move forward; inserted pages have nothing left to purge
+        conn.executemany(
+            "UPDATE pages SET stage = ?, purge = purge AND ? "
+            "WHERE document_key = ? AND pageidx = ? AND stage < ?",
+            (
+                (stage, stage < PageStage.INSERTED, document_key, pageidx, stage)
+                for document_key, pageidx in pages
+            ),
+        )
+
+    def pages_to_purge(self, pages: Iterable[tuple[str, int]]) -> dict[str, list[int]]:
+        pageidxs_by_document: dict[str, list[int]] = {}
+        with self._connect() as conn:
+            for document_key, pageidx in pages:
+                row = conn.execute(
+                    "SELECT purge FROM pages WHERE document_key = ? AND pageidx = ?",
+                    (document_key, pageidx),
+                ).fetchone()
+                if row is not None and row[0]:
+                    pageidxs_by_document.setdefault(document_key, []).append(pageidx)
+        return pageidxs_by_document
+
+    def save_embedded(self, batch: ChunkBatch) -> None:
+        if batch.embeddings is None:
+            raise ValueError("ChunkBatch has no embeddings")
+
+        embeddings = batch.embeddings.astype(np.float32, copy=False)
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO pending_chunks (chunk_id, document_key, "
+                "pageidx, text, num_tokens, metadata, embedding) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    (
+                        batch.chunk_ids[idx],
+                        batch.metadata["filename"][idx],
+                        batch.metadata["pageidx"][idx],
+                        batch.texts[idx],
+                        batch.num_tokens[idx],
+                        json.dumps(batch.metadata_row(idx)),
+                        embeddings[idx].tobytes(),
+                    )
+                    for idx in range(len(batch))
+                ),
+            )
+            self._mark_pages(conn, self.pages_of(batch), PageStage.EMBEDDED)
+
+    def load_embedded(
+        self, document_key: str, pageidxs: Collection[int] | None = None
+    ) -> ChunkBatch | None:
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT chunk_id, text, num_tokens, metadata, embedding, pageidx "
+                "FROM pending_chunks WHERE document_key = ? ORDER BY rowid",
+                (document_key,),
+            ).fetchall()
+        if pageidxs is not None:
+            pageidxs = set(pageidxs)
+            rows = [row for row in rows if row[-1] in pageidxs]
+        if not rows:
+            return None
+
+        chunk_ids, texts, num_tokens, metadatas, embeddings, _ = map(list, zip(*rows))
+        metadata: dict[str, list[Any]] = {}
+        for idx, metadata_json in enumerate(metadatas):
+            for key, value in json.loads(metadata_json).items():
+                metadata.setdefault(key, [None] * len(rows))[idx] = value
+
+        return ChunkBatch.from_texts(
+            texts, num_tokens=num_tokens, metadata=metadata, chunk_ids=chunk_ids
+        ).with_embeddings(
+            np.stack(
+                [np.frombuffer(embedding, dtype=np.float32) for embedding in embeddings]
+            )
+        )
+
+    def mark_inserted(self, batch: ChunkBatch) -> None:
+        with self._connect() as conn:
+            conn.executemany(
+                "DELETE FROM pending_chunks WHERE chunk_id = ?",
+                ((chunk_id,) for chunk_id in batch.chunk_ids),
+            )
+            self._mark_pages(conn, self.pages_of(batch), PageStage.INSERTED)
+
+    def summary(self) -> ManifestSummary:
+        with self._connect() as conn:
+            files = conn.execute(
+                "SELECT document_key, MIN(stage) FROM pages "
+                "GROUP BY document_key ORDER BY document_key"
+            ).fetchall()
+            num_pages = conn.execute(
+                "SELECT stage, COUNT(*) FROM pages GROUP BY stage"
+            ).fetchall()
+            (num_pending_chunks,) = conn.execute(
+                "SELECT COUNT(*) FROM pending_chunks"
+            ).fetchone()
+
+        incomplete_files = [
+            document_key for document_key, stage in files if stage < PageStage.INSERTED
+        ]
+        return ManifestSummary(
+            num_files=len(files),
+            num_complete_files=len(files) - len(incomplete_files),
+            num_pages={PageStage(stage): num for stage, num in num_pages},
+            incomplete_files=incomplete_files,
+            num_pending_chunks=num_pending_chunks,
+        )
@@ -0,0 +1,81 @@
+import asyncio
+import logging
+import os
+import socket
+
+from .indexing import IndexingJob, IndexingPipeline
+from .jobqueue import JobQueue, QueuedJob
+
+
+logger = logging.getLogger(__name__)
+
+
+class LeaseLostError(Exception):
+    pass
+
+
+class IndexingWorker:
+    # Claims jobs from a shared queue and runs them through the pipeline,
+    # `concurrency` jobs at a time. Jobs may run twice (expired lease, retry
+    # after a failure), which is safe because chunk ids are deterministic and
+    # the vector store upserts.
+    def __init__(
+        self,
+        queue: JobQueue,
+        pipeline: IndexingPipeline,
+        worker_id: str | None = None,
+        concurrency: int = 2,
+    ) -> None:
+        self.queue = queue
+        self.pipeline = pipeline
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.concurrency = concurrency
+
+    async def _heartbeat(self, job: QueuedJob) -> None:
+        while True:
+            await asyncio.sleep(self.queue.settings.heartbeat_interval)
+            if not await asyncio.to_thread(self.queue.heartbeat, job, self.worker_id):
+                raise LeaseLostError(f"Lost the lease of {job}")
+
+    async def _run_job(self, job: QueuedJob) -> None:
+        logger.info(f"{self.worker_id} running {job} (attempt {job.attempts})")
+        lease_lost = False
+        error: str | None = None
+        try:
+            async with asyncio.TaskGroup() as group:
+                heartbeat = group.create_task(self._heartbeat(job))
+                await self.pipeline.arun(
+                    [IndexingJob(job.filepath, pageidxs=job.pageidxs)]
+                )
+                heartbeat.cancel()
+        except* LeaseLostError:
+            lease_lost = True
+        except* Exception as group_error:
+            error = repr(group_error.exceptions[0])
+
+        if lease_lost:
+            # Another worker owns the job now, leave it alone
+            logger.warning(f"{self.worker_id} abandoned {job}, lease lost")
+        elif error is not None:
+            logger.error(f"{self.worker_id} failed {job}: {error}")
+            await asyncio.to_thread(self.queue.fail, job, self.worker_id, error)
+        else:
+            await asyncio.to_thread(self.queue.complete, job, self.worker_id)
+
+    async def _work(self) -> None:
+        while True:
+            job = await asyncio.to_thread(self.queue.claim, self.worker_id)
+            if job is not None:
+                await self._run_job(job)
+                continue
+
+            # Leased jobs may still come back if their worker dies
+            if not await asyncio.to_thread(self.queue.has_work):
+                return
+            await asyncio.sleep(self.queue.settings.poll_interval)
+
+    async def arun(self) -> None:
+        async with asyncio.TaskGroup() as group:
+            for _ in range(self.concurrency):
+                group.create_task(self._work())
+        logger.info(f"{self.worker_id} done: {self.queue.summary()}")
@@ -0,0 +1,139 @@
+import hashlib
+import os
+import sqlite3
+from collections.abc import Generator
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Protocol
+
+
+class IBlobStore(Protocol):
+    def exists(self, key: str) -> bool: ...
+
+    def put(self, key: str, data: bytes) -> None: ...
+
+    def get_localpath(self, key: str) -> Path: ...
+
+
+def content_key(data: bytes, ext: str) -> str:
+    return f"{hashlib.sha256(data).hexdigest()}.{ext}"
+
+
+class LocalBlobStore:
+    def __init__(self, blobdir: Path) -> None:
+        self.blobdir = blobdir
+        self.blobdir.mkdir(parents=True, exist_ok=True)
+
+    def get_localpath(self, key: str) -> Path:
+        return self.blobdir / key[:2] / key
+
+    def exists(self, key: str) -> bool:
+        return self.get_localpath(key).exists()
+
+    def put(self, key: str, data: bytes) -> None:
+        blobpath = self.get_localpath(key)
+        blobpath.parent.mkdir(parents=True, exist_ok=True)
+
+        # Written aside and renamed, so readers never see a partial blob
+        tmppath = blobpath.with_suffix(f".{os.getpid()}.tmp")
+        tmppath.write_bytes(data)
+        tmppath.replace(blobpath)
+
+
+class S3BlobStore:
+    # Any S3-compatible service; point `endpoint_url` at MinIO for local runs.
+    # Credentials are resolved by boto3 (environment, profile, ...).
+    def __init__(
+        self,
+        bucket: str,
+        cachedir: Path,
+        prefix: str = "",
+        endpoint_url: str | None = None,
+    ) -> None:
+        self.bucket = bucket
+        self.cache = LocalBlobStore(cachedir)
+        self.prefix = prefix
+        self.endpoint_url = endpoint_url
+        self._client: Any = None
+
+    def __getstate__(self) -> dict[str, Any]:
+        # boto3 clients cannot be pickled into worker processes
+        return {**self.__dict__, "_client": None}
+
+    @property
+    def client(self) -> Any:
+        if self._client is None:
+            try:
+                import boto3
+            except ImportError as e:
+                raise ImportError(
+                    "S3BlobStore requires boto3, install it with `uv add boto3`"
+                ) from e
+            self._client = boto3.client("s3", endpoint_url=self.endpoint_url)
+        return self._client
+
+    def _object_key(self, key: str) -> str:
+        return f"{self.prefix}{key[:2]}/{key}"
+
+    def exists(self, key: str) -> bool:
+        from botocore.exceptions import ClientError
+
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._object_key(key))
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in {"404", "NoSuchKey"}:
+                return False
+            raise
+        return True
+
+    def put(self, key: str, data: bytes) -> None:
+        self.client.put_object(Bucket=self.bucket, Key=self._object_key(key), Body=data)
+        self.cache.put(key, data)
+
+    def get_localpath(self, key: str) -> Path:
+        # Blobs are immutable, so a local copy never goes stale
+        localpath = self.cache.get_localpath(key)
+        if not localpath.exists():
+            localpath.parent.mkdir(parents=True, exist_ok=True)
+            tmppath = localpath.with_suffix(f".{os.getpid()}.tmp")
+            self.client.download_file(self.bucket, self._object_key(key), str(tmppath))
+            tmppath.replace(localpath)
+        return localpath
+
+
+class BlobIndex:
+    # Maps storage paths to blob keys. A short-lived connection per call keeps
+    # it safe to share across threads and worker processes.
+    def __init__(self, dbpath: Path) -> None:
+        self.dbpath = dbpath
+        self.dbpath.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS paths "
+                "(relpath TEXT PRIMARY KEY, key TEXT NOT NULL)"
+            )
+
+    @contextmanager
+    def _connect(self) -> Generator[sqlite3.Connection, None, None]:
+        conn = sqlite3.connect(self.dbpath, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, relpath: str) -> str | None:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT key FROM paths WHERE relpath = ?", (relpath,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def set(self, relpath: str, key: str) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO paths (relpath, key) VALUES (?, ?) "
+                "ON CONFLICT(relpath) DO UPDATE SET key = excluded.key",
+                (relpath, key),
+            )
@@ -1,9 +1,15 @@
+import asyncio
+import io
 from dataclasses import dataclass
 from pathlib import Path
+from typing import Any
 from uuid import uuid4
 
 from PIL import Image
 
+from .blob import BlobIndex, IBlobStore, content_key
+from .render import PageRenderRequest
+
 
 @dataclass
 class Storage:
@@ -15,15 +21,90 @@ class Storage:
     def gen_path(self, reldir: str, name: str | None = None, ext: str = "png") -> str:
         return str(Path(reldir) / f"{name or {str(uuid4())}}.{ext}")
 
-    def save_image(self, image: Image, relpath: str) -> Path:
+    def save_image(self, image: Image.Image, relpath: str, **kwargs: Any) -> Path:
         imagepath = self.imagedir / relpath
         imagepath.parent.mkdir(parents=True, exist_ok=True)
 
         if imagepath.exists():
             imagepath.unlink()
 
-        image.save(imagepath)
+        image.save(imagepath, **kwargs)
         return imagepath
 
+    async def asave_image(
+        self, image: Image.Image, relpath: str, **kwargs: Any
+    ) -> Path:
+        # Encoding and writing mostly release the GIL, keep them off the loop
+        return await asyncio.to_thread(self.save_image, image, relpath, **kwargs)
+
+    def _render_request_path(self, relpath: str) -> Path:
+        return self.imagedir / f"{relpath}{PageRenderRequest.SUFFIX}"
+
+    def save_render_request(self, request: PageRenderRequest, relpath: str) -> Path:
+        if request.filepath is None:
+            raise ValueError("Lazy rendering needs a document on disk")
+        requestpath = self._render_request_path(relpath)
+        requestpath.parent.mkdir(parents=True, exist_ok=True)
+        requestpath.write_text(request.model_dump_json())
+        return requestpath
+
+    def render(self, request: PageRenderRequest, relpath: str) -> Path:
+        return self.save_image(request.render(), relpath, **request.save_kwargs)
+
+    def _render_pending(self, relpath: str) -> None:
+        # Lazily rendered images only exist as a render request until asked for
+        requestpath = self._render_request_path(relpath)
+        if requestpath.exists():
+            request = PageRenderRequest.model_validate_json(requestpath.read_text())
+            self.render(request, relpath)
+            requestpath.unlink(missing_ok=True)
+
+    def exists(self, relpath: str) -> bool:
+        return (self.imagedir / relpath).exists() or self._render_request_path(
+            relpath
+        ).exists()
+
+    def get_localpath(self, remotepath: str) -> Path:
+        localpath = self.imagedir / remotepath
+        if not localpath.exists():
+            self._render_pending(remotepath)
+
+        return localpath
+
+
+@dataclass
+class ContentAddressedStorage(Storage):
+    # Images are stored once per content hash in `blobstore`, and `index`
+    # maps every path handed out by `gen_path` to its blob.
+    blobstore: IBlobStore
+    index: BlobIndex
+
+    def save_image(self, image: Image.Image, relpath: str, **kwargs: Any) -> Path:
+        ext = Path(relpath).suffix
+        kwargs.setdefault("format", Image.registered_extensions()[ext])
+
+        buffer = io.BytesIO()
+        image.save(buffer, **kwargs)
+        data = buffer.getvalue()
+
+        key = content_key(data, ext.removeprefix("."))
+        if not self.blobstore.exists(key):
+            self.blobstore.put(key, data)
+        self.index.set(relpath, key)
+        return self.blobstore.get_localpath(key)
+
+    def exists(self, relpath: str) -> bool:
+        return (
+            self.index.get(relpath) is not None
+            or self._render_request_path(relpath).exists()
+        )
+
     def get_localpath(self, remotepath: str) -> Path:
-        return self.imagedir / remotepath
+        key = self.index.get(remotepath)
+        if key is None:
+            self._render_pending(remotepath)
+            key = self.index.get(remotepath)
+
+        if key is None:
+            return self.imagedir / remotepath
+        return self.blobstore.get_localpath(key)
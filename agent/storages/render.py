@@ -0,0 +1,48 @@
+from pathlib import Path
+from typing import Any, ClassVar, Literal
+
+import pymupdf
+from PIL import Image
+from pydantic import BaseModel
+
+
+class PageRenderRequest(BaseModel):
+    # Sidecar written next to an image path that is rendered on first access
+    SUFFIX: ClassVar[str] = ".render.json"
+    PIL_FORMATS: ClassVar[dict[str, str]] = {
+        "png": "PNG",
+        "jpeg": "JPEG",
+        "webp": "WEBP",
+    }
+
+    # None for in-memory documents, which can only be rendered eagerly
+    filepath: Path | None = None
+    pageidx: int
+    dpi: int = 72
+    format: Literal["png", "jpeg", "webp"] = "png"
+    quality: int = 85
+    # Bound on the longest side, used for thumbnails
+    max_size: int | None = None
+
+    @property
+    def save_kwargs(self) -> dict[str, Any]:
+        kwargs: dict[str, Any] = {"format": self.PIL_FORMATS[self.format]}
+        if self.format != "png":
+            kwargs["quality"] = self.quality
+        return kwargs
+
+    def render_page(self, page: pymupdf.Page) -> Image.Image:
+        pixmap = page.get_pixmap(dpi=self.dpi, alpha=False)
+        image = Image.frombytes("RGB", (pixmap.width, pixmap.height), pixmap.samples)
+        if self.max_size is not None:
+            image.thumbnail((self.max_size, self.max_size))
+        return image
+
+    def render(self) -> Image.Image:
+        if self.filepath is None:
+            raise ValueError(
+                f"Page {self.pageidx} of an in-memory document cannot be rendered "
+                "on demand, render it while extracting instead"
+            )
+        with pymupdf.Document(self.filepath) as document:
+            return self.render_page(document[self.pageidx - 1])
@@ -1,6 +1,12 @@
+from .interface import IVectorStore
+from .embedded import EmbeddedVectorStore
 from .milvus import Milvus
+from .snapshot import SnapshotManifest
 
 
 __all__ = [
+    "IVectorStore",
+    "EmbeddedVectorStore",
     "Milvus",
+    "SnapshotManifest",
 ]
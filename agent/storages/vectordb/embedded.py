@@ -0,0 +1,273 @@
+import json
+import logging
+from collections.abc import Sequence
+from pathlib import Path
+from typing import Any, ClassVar
+
+import numpy as np
+import numpy.typing as npt
+from pydantic import BaseModel, Field
+
+from agent.models.document import Chunk, ChunkBatch, ScoredChunk, ScoredChunks
+from agent.models.embeddings import BaseEmbedding, EmbeddingSize
+from agent.models.trusted import TrustedModels
+
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddedVectorStoreConfig(BaseModel):
+    dimensions: int = Field(default=EmbeddingSize.small)
+    initial_capacity: int = Field(default=1024)
+
+
+class EmbeddedVectorStore:
+    VECTORS_FILENAME: ClassVar[str] = "vectors.f32"
+    RECORDS_FILENAME: ClassVar[str] = "records.jsonl"
+
+    def __init__(
+        self,
+        storedir: Path,
+        config: EmbeddedVectorStoreConfig | None = None,
+    ) -> None:
+        self.storedir = storedir
+        self.config = config or EmbeddedVectorStoreConfig()
+        self.storedir.mkdir(parents=True, exist_ok=True)
+
+        self.records: list[dict[str, Any]] = []
+        self.row_by_id: dict[str, int] = {}
+        self.deleted_rows: set[int] = set()
+        self.vectors = self._open_vectors(self.config.initial_capacity)
+        self._load_records()
+
+    @property
+    def vectors_path(self) -> Path:
+        return self.storedir / self.VECTORS_FILENAME
+
+    @property
+    def records_path(self) -> Path:
+        return self.storedir / self.RECORDS_FILENAME
+
+    @property
+    def capacity(self) -> int:
+        return int(self.vectors.shape[0])
+
+    def __len__(self) -> int:
+        return len(self.records) - len(self.deleted_rows)
+
+    def _open_vectors(self, min_capacity: int) -> np.memmap[Any, np.dtype[np.float32]]:
+        row_nbytes = self.config.dimensions * np.dtype(np.float32).itemsize
+        existing_capacity = 0
+        if self.vectors_path.exists():
+            existing_capacity = self.vectors_path.stat().st_size // row_nbytes
+
+        capacity = max(existing_capacity, min_capacity)
+        with open(self.vectors_path, "ab") as f:
+            f.truncate(capacity * row_nbytes)
+
+        return np.memmap(
+            self.vectors_path,
+            dtype=np.float32,
+            mode="r+",
+            shape=(capacity, self.config.dimensions),
+        )
+
+    def _load_records(self) -> None:
+        if not self.records_path.exists():
+            return
+
+        # Vectors are flushed before their records are appended, so the
+        # records file decides how many rows of the matrix are valid. An
+        # upsert appends a new record for an existing row; the last one wins.
+        with open(self.records_path, "r") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                row = record.pop("row", len(self.records))
+                if row == len(self.records):
+                    self.records.append(record)
+                else:
+                    self.records[row] = record
+        self.row_by_id = {record["id"]: row for row, record in enumerate(self.records)}
+        self.deleted_rows = {
+            row for row, record in enumerate(self.records) if record.get("deleted")
+        }
+
+        if len(self.records) > self.capacity:
+            raise ValueError(
+                f"Found {len(self.records)} records but only "
+                f"{self.capacity} vectors in {self.storedir}"
+            )
+        logger.info(f"Loaded {len(self.records)} records from {self.storedir}")
+
+    def _reserve(self, num_rows: int) -> None:
+        required = len(self.records) + num_rows
+        if required <= self.capacity:
+            return
+
+        self.vectors.flush()
+        self.vectors = self._open_vectors(max(required, 2 * self.capacity))
+
+    @staticmethod
+    def _normalize(vectors: npt.NDArray[np.float32]) -> npt.NDArray[np.float32]:
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.maximum(norms, np.finfo(np.float32).eps)
+
+    def _upsert(
+        self, vectors: npt.NDArray[np.float32], records: list[dict[str, Any]]
+    ) -> None:
+        if len(vectors) != len(records):
+            raise ValueError(f"Got {len(records)} records but {len(vectors)} vectors")
+
+        # Known ids overwrite their row in place, so re-indexing a document
+        # does not duplicate its chunks.
+        rows: list[int] = []
+        num_rows = len(self.records)
+        for record in records:
+            row = self.row_by_id.get(record["id"])
+            if row is None:
+                row = self.row_by_id[record["id"]] = num_rows
+                num_rows += 1
+            rows.append(row)
+
+        self._reserve(num_rows - len(self.records))
+        self.vectors[rows] = self._normalize(vectors)
+        self.vectors.flush()
+
+        with open(self.records_path, "a") as f:
+            f.writelines(
+                json.dumps({**record, "row": row}) + "\n"
+                for row, record in zip(rows, records)
+            )
+        for row, record in zip(rows, records):
+            if row == len(self.records):
+                self.records.append(record)
+            else:
+                self.records[row] = record
+        self.deleted_rows.difference_update(rows)
+
+        logger.info(f"Upserted {len(records)} chunks to {self.storedir}")
+
+    async def add(
+        self, chunks: Sequence[Chunk], embeddings: Sequence[BaseEmbedding]
+    ) -> None:
+        self._upsert(
+            np.asarray(
+                [embedding.embedding for embedding in embeddings], dtype=np.float32
+            ),
+            [
+                {
+                    "id": str(chunk.chunk_id),
+                    "text": chunk.text,
+                    "num_tokens": chunk.num_tokens,
+                    "metadata": chunk.metadata.model_dump(mode="json"),
+                }
+                for chunk in chunks
+            ],
+        )
+
+    async def delete(self, filtered_dict: dict[str, list[str | int]]) -> None:
+        if not filtered_dict:
+            raise ValueError("Refusing to delete without a filter")
+
+        # Rows are not reclaimed: a tombstone keeps the row, which a later
+        # upsert of the same id reuses
+        rows = np.flatnonzero(self._filter_mask(filtered_dict)).tolist()
+        tombstones = [
+            {"id": self.records[row]["id"], "deleted": True, "metadata": {}}
+            for row in rows
+        ]
+        with open(self.records_path, "a") as f:
+            f.writelines(
+                json.dumps({**tombstone, "row": row}) + "\n"
+                for row, tombstone in zip(rows, tombstones)
+            )
+        for row, tombstone in zip(rows, tombstones):
+            self.records[row] = tombstone
+        self.deleted_rows.update(rows)
+
+        logger.info(f"Deleted {len(rows)} chunks from {self.storedir}")
+
+    async def add_batch(self, batch: ChunkBatch) -> None:
+        if batch.embeddings is None:
+            raise ValueError("ChunkBatch has no embeddings")
+
+        self._upsert(
+            batch.embeddings,
+            [
+                {
+                    "id": chunk_id,
+                    "text": text,
+                    "num_tokens": num_tokens,
+                    "metadata": batch.metadata_row(idx),
+                }
+                for idx, (chunk_id, text, num_tokens) in enumerate(
+                    zip(batch.chunk_ids, batch.texts, batch.num_tokens)
+                )
+            ],
+        )
+
+    def _filter_mask(
+        self, filtered_dict: dict[str, list[str | int]]
+    ) -> npt.NDArray[np.bool_]:
+        return np.fromiter(
+            (
+                all(
+                    record["metadata"].get(key) in values
+                    for key, values in filtered_dict.items()
+                )
+                for record in self.records
+            ),
+            dtype=np.bool_,
+            count=len(self.records),
+        )
+
+    async def search(
+        self,
+        query: BaseEmbedding,
+        top_k: int = 10,
+        filtered_dict: dict[str, list[str | int]] | None = None,
+        min_score: float | None = None,
+        with_embeddings: bool = False,
+    ) -> ScoredChunks:
+        if len(self.records) == 0 or top_k <= 0:
+            return ScoredChunks([])
+
+        # Exact search: a single BLAS matrix-vector product over the
+        # normalized matrix gives the cosine similarity of every row.
+        query_vector = self._normalize(np.asarray(query.embedding, dtype=np.float32))
+        scores = self.vectors[: len(self.records)] @ query_vector
+
+        candidates: npt.NDArray[np.intp] = np.arange(len(self.records))
+        if self.deleted_rows:
+            candidates = np.setdiff1d(
+                candidates, np.fromiter(self.deleted_rows, dtype=np.int64)
+            )
+        if filtered_dict:
+            candidates = candidates[self._filter_mask(filtered_dict)[candidates]]
+        if min_score is not None:
+            candidates = candidates[scores[candidates] >= min_score]
+
+        if len(candidates) > top_k:
+            candidate_scores = scores[candidates]
+            partitioned = np.argpartition(-candidate_scores, top_k - 1)[:top_k]
+            candidates = candidates[partitioned]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+
+        return ScoredChunks(
+            [
+                TrustedModels.construct(
+                    ScoredChunk,
+                    chunk=Chunk.from_trusted(
+                        chunk_id=self.records[idx]["id"],
+                        text=self.records[idx]["text"],
+                        metadata=self.records[idx]["metadata"],
+                        num_tokens=self.records[idx].get("num_tokens"),
+                    ),
+                    score=float(scores[idx]),
+                    embedding=self.vectors[idx].tolist() if with_embeddings else None,
+                )
+                for idx in candidates
+            ]
+        )
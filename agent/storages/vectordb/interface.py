@@ -0,0 +1,24 @@
+from collections.abc import Sequence
+from typing import Protocol
+
+from agent.models.document import Chunk, ChunkBatch, ScoredChunks
+from agent.models.embeddings import BaseEmbedding
+
+
+class IVectorStore(Protocol):
+    async def add(
+        self, chunks: Sequence[Chunk], embeddings: Sequence[BaseEmbedding]
+    ) -> None: ...
+
+    async def add_batch(self, batch: ChunkBatch) -> None: ...
+
+    async def delete(self, filtered_dict: dict[str, list[str | int]]) -> None: ...
+
+    async def search(
+        self,
+        query: BaseEmbedding,
+        top_k: int = 10,
+        filtered_dict: dict[str, list[str | int]] | None = None,
+        min_score: float | None = None,
+        with_embeddings: bool = False,
+    ) -> ScoredChunks: ...
@@ -1,8 +1,9 @@
-from collections.abc import Sequence
+import asyncio
+from collections.abc import AsyncGenerator, Sequence
 from enum import StrEnum
 import logging
-from typing import Any, TypedDict
-from uuid import UUID
+from pathlib import Path
+from typing import Any, Literal, TypedDict, cast
 from pydantic import Field, BaseModel
 from pymilvus import (
     AsyncMilvusClient,
@@ -12,10 +13,13 @@ from pymilvus import (
     MilvusClient,
 )
 from pymilvus.milvus_client.index import IndexParams
+import numpy as np
 
 from agent.batched import Batched
-from agent.models.document import Chunk, ScoredChunk, ScoredChunks
+from agent.models.document import Chunk, ChunkBatch, ScoredChunk, ScoredChunks
 from agent.models.embeddings import BaseEmbedding, EmbeddingSize
+from agent.models.trusted import TrustedModels
+from .snapshot import SnapshotBatch, SnapshotManifest, SnapshotReader, SnapshotWriter
 
 
 logger = logging.getLogger(__name__)
@@ -39,22 +43,96 @@ class MilvusConfig(BaseModel):
     fieldname_id: str = Field(default="id")
     fieldname_ann_embedding: str = Field(default="embedding")
     fieldname_text: str = Field(default="text")
+    fieldname_num_tokens: str = Field(default="num_tokens")
 
     dimensions: int = Field(default=EmbeddingSize.small)
+    metric_type: Literal["IP", "COSINE"] = "IP"
     consistency: MilvusConsistency = MilvusConsistency.SESSION
 
     def parse_record(self, record: RetrievedRecord) -> ScoredChunk:
-        params = {
-            "chunk_id": UUID(record["id"]),
-            "text": record["entity"][self.fieldname_text],
-            "metadata": record["entity"],
+        entity = dict(record["entity"])
+        embedding = entity.pop(self.fieldname_ann_embedding, None)
+
+        # Both supported metrics are similarities: larger is closer.
+        return TrustedModels.construct(
+            ScoredChunk,
+            chunk=Chunk.from_trusted(
+                chunk_id=record["id"],
+                text=entity[self.fieldname_text],
+                metadata=entity,
+                num_tokens=entity.get(self.fieldname_num_tokens),
+            ),
+            score=record["distance"],
+            embedding=embedding,
+        )
+
+    def output_fields(self, with_embeddings: bool = False) -> list[str]:
+        if with_embeddings:
+            return [self.fieldname_ann_embedding, "*"]
+        return ["*"]
+
+    def batch_rows(self, batch: ChunkBatch) -> list[dict[str, Any]]:
+        if batch.embeddings is None:
+            raise ValueError("ChunkBatch has no embeddings")
+
+        columns: dict[str, list[Any]] = {
+            self.fieldname_id: batch.chunk_ids,
+            self.fieldname_ann_embedding: batch.embeddings.tolist(),
+            self.fieldname_text: batch.texts,
+            self.fieldname_num_tokens: batch.num_tokens,
+            **batch.metadata,
         }
+        return [dict(zip(columns, values)) for values in zip(*columns.values())]
 
-        return ScoredChunk(
-            chunk=Chunk.model_validate(params),
-            score=1.0 - record["distance"],
+    def search_params(self, min_score: float | None = None) -> dict[str, Any]:
+        params: dict[str, Any] = {"metric_type": self.metric_type}
+        if min_score is not None:
+            # Range search, see https://milvus.io/docs/range-search.md
+            params["params"] = {"radius": min_score}
+        return params
+
+    def to_snapshot_batch(self, records: list[dict[str, Any]]) -> SnapshotBatch:
+        reserved = {
+            self.fieldname_id,
+            self.fieldname_text,
+            self.fieldname_ann_embedding,
+        }
+        return SnapshotBatch(
+            ids=[record[self.fieldname_id] for record in records],
+            texts=[record[self.fieldname_text] for record in records],
+            metadatas=[
+                {key: value for key, value in record.items() if key not in reserved}
+                for record in records
+            ],
+            vectors=np.asarray(
+                [record[self.fieldname_ann_embedding] for record in records],
+                dtype=np.float32,
+            ),
         )
 
+    def mismatched_fields(self, config: dict[str, Any]) -> list[str]:
+        # Settings the collection shares with the config it was created from,
+        # consistency is a per-request default and may differ
+        current = self.model_dump(mode="json", exclude={"consistency"})
+        return [
+            key
+            for key, value in current.items()
+            if key in config and config[key] != value
+        ]
+
+    def from_snapshot_batch(self, batch: SnapshotBatch) -> list[dict[str, Any]]:
+        return [
+            {
+                self.fieldname_id: id_,
+                self.fieldname_ann_embedding: vector,
+                self.fieldname_text: text,
+                **metadata,
+            }
+            for id_, text, metadata, vector in zip(
+                batch.ids, batch.texts, batch.metadatas, batch.vectors.tolist()
+            )
+        ]
+
     @property
     def id(self) -> FieldSchema:
         return FieldSchema(
@@ -101,7 +179,7 @@ class MilvusConfig(BaseModel):
             field_name=self.fieldname_ann_embedding,
             index_name="ann_index",
             index_type="AUTOINDEX",
-            metric_type="IP",
+            metric_type=self.metric_type,
         )
 
         return params
@@ -159,6 +237,7 @@ class Milvus:
                         self.config.fieldname_id: str(chunks[idx].chunk_id),
                         self.config.fieldname_ann_embedding: embeddings[idx].embedding,
                         self.config.fieldname_text: chunks[idx].text,
+                        self.config.fieldname_num_tokens: chunks[idx].num_tokens,
                         **chunks[idx].metadata.model_dump(),
                     }
                     for idx in batched_idxs
@@ -166,30 +245,210 @@ class Milvus:
             )
         logger.info(f"Added {len(chunks)} chunks to collection {self.collection_name}")
 
-    async def search(
-        self,
-        query: BaseEmbedding,
-        top_k: int = 10,
-        filtered_dict: dict[str, list[str | int]] | None = None,
-    ) -> ScoredChunks:
+    async def add_batch(self, batch: ChunkBatch) -> None:
+        async_client = self.async_client
+        for start in range(0, len(batch), self.batch_size):
+            # Upsert: chunk ids are deterministic, so re-indexed chunks
+            # replace their previous rows
+            await async_client.upsert(
+                collection_name=self.collection_name,
+                data=self.config.batch_rows(
+                    batch.slice(start, start + self.batch_size)
+                ),
+            )
+        logger.info(
+            f"Upserted {len(batch)} chunks to collection {self.collection_name}"
+        )
+
+    async def delete(self, filtered_dict: dict[str, list[str | int]]) -> None:
+        filter_expr = self.build_filter_expr(filtered_dict)
+        if not filter_expr:
+            raise ValueError("Refusing to delete without a filter")
+
+        await self.async_client.delete(
+            collection_name=self.collection_name, filter=filter_expr
+        )
+        logger.info(f"Deleted {filter_expr} from collection {self.collection_name}")
+
+    @staticmethod
+    def build_filter_expr(filtered_dict: dict[str, list[str | int]] | None) -> str:
         filter_expr = ""
         if filtered_dict:
             exprs = [f"{key} in {str(value)}" for key, value in filtered_dict.items()]
             filter_expr = " and ".join(exprs)
             logger.info(f"Filtering with {filter_expr}")
+        return filter_expr
 
+    async def search(
+        self,
+        query: BaseEmbedding,
+        top_k: int = 10,
+        filtered_dict: dict[str, list[str | int]] | None = None,
+        min_score: float | None = None,
+        with_embeddings: bool = False,
+    ) -> ScoredChunks:
         # semantic search
         searches: list[list[RetrievedRecord]] = await self.async_client.search(
             collection_name=self.collection_name,
             data=[query.embedding],
             limit=top_k,
             anns_field=self.config.fieldname_ann_embedding,
-            output_fields=["*"],
-            filter=filter_expr,
+            output_fields=self.config.output_fields(with_embeddings),
+            filter=self.build_filter_expr(filtered_dict),
+            search_params=self.config.search_params(min_score),
         )
 
         scored_chunks = ScoredChunks(
             [self.config.parse_record(hit) for hit in searches[0]]
         )
 
-        return scored_chunks.sort().limit(top_k)
+        return scored_chunks.top(top_k)
+
+    async def search_iter(
+        self,
+        query: BaseEmbedding,
+        batch_size: int = 100,
+        filtered_dict: dict[str, list[str | int]] | None = None,
+        min_score: float | None = None,
+        limit: int | None = None,
+    ) -> AsyncGenerator[ScoredChunks, None]:
+        kwargs: dict[str, Any] = {}
+        if limit is not None:
+            kwargs["limit"] = limit
+
+        # Search iterators are only exposed by the sync client, so every page
+        # is fetched on a worker thread to keep the event loop free.
+        iterator = await asyncio.to_thread(
+            self.client.search_iterator,
+            collection_name=self.collection_name,
+            data=[query.embedding],
+            batch_size=batch_size,
+            filter=self.build_filter_expr(filtered_dict),
+            output_fields=["*"],
+            search_params=self.config.search_params(min_score),
+            anns_field=self.config.fieldname_ann_embedding,
+            **kwargs,
+        )
+        try:
+            while page := await asyncio.to_thread(iterator.next):
+                yield ScoredChunks(
+                    [
+                        self.config.parse_record(cast(RetrievedRecord, hit))
+                        for hit in page
+                    ]
+                )
+        finally:
+            iterator.close()
+
+    def count_entities(self, client: MilvusClient) -> int:
+        counts = client.query(
+            collection_name=self.collection_name,
+            output_fields=["count(*)"],
+            consistency_level=MilvusConsistency.STRONG,
+        )
+        return counts[0]["count(*)"]
+
+    def describe_indexes(self, client: MilvusClient) -> list[dict[str, Any]]:
+        return [
+            client.describe_index(self.collection_name, index_name)
+            for index_name in client.list_indexes(self.collection_name)
+        ]
+
+    def export_snapshot(self, snapshotdir: Path) -> SnapshotManifest:
+        client = self.client
+        writer = SnapshotWriter(
+            snapshotdir,
+            capacity=self.count_entities(client),
+            dimensions=self.config.dimensions,
+        )
+        iterator = client.query_iterator(
+            collection_name=self.collection_name,
+            batch_size=self.batch_size,
+            output_fields=[self.config.fieldname_ann_embedding, "*"],
+        )
+        try:
+            while records := iterator.next():
+                writer.write(self.config.to_snapshot_batch(records))
+        finally:
+            iterator.close()
+
+        manifest = writer.close(
+            SnapshotManifest(
+                collection_name=self.collection_name,
+                num_entities=writer.num_entities,
+                dimensions=self.config.dimensions,
+                config=self.config.model_dump(mode="json"),
+                indexes=self.describe_indexes(client),
+            )
+        )
+        logger.info(
+            f"Exported {manifest.num_entities} entities "
+            f"from collection {self.collection_name} to {snapshotdir}"
+        )
+        return manifest
+
+    def check_restore(self, manifest: SnapshotManifest) -> None:
+        # Rows are inserted as they were exported: the collection must be
+        # empty, laid out like the exported one and indexed the same way
+        if manifest.dimensions != self.config.dimensions:
+            raise ValueError(
+                f"Snapshot has {manifest.dimensions} dimensions, "
+                f"collection {self.collection_name} expects {self.config.dimensions}"
+            )
+        if mismatched_fields := self.config.mismatched_fields(manifest.config):
+            raise ValueError(
+                f"Snapshot config differs from collection {self.collection_name} "
+                f"on {', '.join(mismatched_fields)}"
+            )
+
+        client = self.client
+        fields = {
+            field["name"]: field
+            for field in client.describe_collection(self.collection_name)["fields"]
+        }
+        for expected in self.config.schema.fields:
+            field = fields.get(expected.name)
+            dimensions = expected.params.get("dim")
+            if field is None or (
+                dimensions is not None
+                and int(field.get("params", {}).get("dim", -1)) != dimensions
+            ):
+                raise ValueError(
+                    f"Collection {self.collection_name} has no field {expected.name} "
+                    "matching the snapshot, drop it before restoring"
+                )
+
+        indexes = {
+            index.get("field_name"): index for index in self.describe_indexes(client)
+        }
+        for index in manifest.indexes:
+            current = indexes.get(index.get("field_name"), {})
+            for key in ("index_type", "metric_type"):
+                if current.get(key) != index.get(key):
+                    raise ValueError(
+                        f"Snapshot index on {index.get('field_name')} has "
+                        f"{key} {index.get(key)}, collection {self.collection_name} "
+                        f"has {current.get(key)}"
+                    )
+
+        if num_entities := self.count_entities(client):
+            raise ValueError(
+                f"Collection {self.collection_name} already has {num_entities} "
+                "entities, drop it before restoring a snapshot"
+            )
+
+    async def restore_snapshot(self, snapshotdir: Path) -> SnapshotManifest:
+        reader = SnapshotReader(snapshotdir)
+        self.check_restore(reader.manifest)
+
+        async_client = self.async_client
+        for batch in reader.iter_batches(self.batch_size):
+            await async_client.insert(
+                collection_name=self.collection_name,
+                data=self.config.from_snapshot_batch(batch),
+            )
+        logger.info(
+            f"Restored {reader.manifest.num_entities} entities "
+            f"from {snapshotdir} to collection {self.collection_name}"
+        )
+        return reader.manifest
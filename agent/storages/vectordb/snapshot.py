@@ -0,0 +1,142 @@
+import json
+from collections.abc import Generator
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, ClassVar, Self
+
+import numpy as np
+import numpy.typing as npt
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pydantic import BaseModel, Field
+
+
+class SnapshotManifest(BaseModel):
+    FILENAME: ClassVar[str] = "manifest.json"
+
+    collection_name: str
+    num_entities: int
+    dimensions: int
+    config: dict[str, Any] = Field(default_factory=dict)
+    indexes: list[dict[str, Any]] = Field(default_factory=list)
+
+    @classmethod
+    def load(cls, snapshotdir: Path) -> Self:
+        with open(snapshotdir / cls.FILENAME, "r") as f:
+            return cls.model_validate_json(f.read())
+
+    def save(self, snapshotdir: Path) -> None:
+        with open(snapshotdir / self.FILENAME, "w") as f:
+            f.write(self.model_dump_json(indent=2))
+
+
+@dataclass
+class SnapshotBatch:
+    ids: list[str]
+    texts: list[str]
+    metadatas: list[dict[str, Any]]
+    vectors: npt.NDArray[np.float32]
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+
+class SnapshotWriter:
+    VECTORS_FILENAME: ClassVar[str] = "vectors.npy"
+    RECORDS_FILENAME: ClassVar[str] = "records.parquet"
+    RECORDS_SCHEMA: ClassVar[pa.Schema] = pa.schema(
+        [
+            ("id", pa.string()),
+            ("text", pa.string()),
+            ("metadata", pa.string()),
+        ]
+    )
+
+    def __init__(self, snapshotdir: Path, capacity: int, dimensions: int) -> None:
+        self.snapshotdir = snapshotdir
+        self.snapshotdir.mkdir(parents=True, exist_ok=True)
+        self.capacity = capacity
+        self.num_entities = 0
+
+        # The row count is known upfront, so vectors are streamed straight
+        # into a memory-mapped .npy file instead of being held in memory.
+        # numpy ships open_memmap without annotations.
+        self.vectors: np.memmap[Any, np.dtype[np.float32]]
+        self.vectors = np.lib.format.open_memmap(  # type: ignore[no-untyped-call]
+            self.snapshotdir / self.VECTORS_FILENAME,
+            mode="w+",
+            dtype=np.float32,
+            shape=(capacity, dimensions),
+        )
+        self.records = pq.ParquetWriter(
+            self.snapshotdir / self.RECORDS_FILENAME,
+            self.RECORDS_SCHEMA,
+            compression="zstd",
+        )
+
+    def write(self, batch: SnapshotBatch) -> int:
+        num_rows = min(len(batch), self.capacity - self.num_entities)
+        if num_rows <= 0:
+            return 0
+
+        start, end = self.num_entities, self.num_entities + num_rows
+        self.vectors[start:end] = batch.vectors[:num_rows]
+        self.records.write_table(
+            pa.table(
+                {
+                    "id": batch.ids[:num_rows],
+                    "text": batch.texts[:num_rows],
+                    "metadata": [
+                        json.dumps(metadata) for metadata in batch.metadatas[:num_rows]
+                    ],
+                },
+                schema=self.RECORDS_SCHEMA,
+            )
+        )
+        self.num_entities = end
+        return num_rows
+
+    def close(self, manifest: SnapshotManifest) -> SnapshotManifest:
+        self.vectors.flush()
+        self.records.close()
+
+        manifest = manifest.model_copy(update={"num_entities": self.num_entities})
+        manifest.save(self.snapshotdir)
+        return manifest
+
+
+class SnapshotReader:
+    def __init__(self, snapshotdir: Path) -> None:
+        self.snapshotdir = snapshotdir
+        self.manifest = SnapshotManifest.load(snapshotdir)
+
+    def iter_batches(
+        self, batch_size: int = 512
+    ) -> Generator[SnapshotBatch, None, None]:
+        vectors = np.load(
+            self.snapshotdir / SnapshotWriter.VECTORS_FILENAME,
+            mmap_mode="r",
+        )
+        if vectors.shape[1] != self.manifest.dimensions:
+            raise ValueError(
+                f"Snapshot vectors have {vectors.shape[1]} dimensions, "
+                f"expected {self.manifest.dimensions}"
+            )
+
+        records = pq.ParquetFile(self.snapshotdir / SnapshotWriter.RECORDS_FILENAME)
+        offset = 0
+        for record_batch in records.iter_batches(batch_size=batch_size):
+            columns = record_batch.to_pydict()
+            num_rows = min(record_batch.num_rows, self.manifest.num_entities - offset)
+            if num_rows <= 0:
+                break
+
+            yield SnapshotBatch(
+                ids=columns["id"][:num_rows],
+                texts=columns["text"][:num_rows],
+                metadatas=[
+                    json.loads(metadata) for metadata in columns["metadata"][:num_rows]
+                ],
+                vectors=vectors[offset : offset + num_rows],
+            )
+            offset += num_rows
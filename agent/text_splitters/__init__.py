@@ -1,11 +1,20 @@
-from .interface import ITextSplitter, TextSplitterArguments
+from .interface import (
+    IStreamingTextSplitter,
+    ITextSplitter,
+    TextSplitterArguments,
+    TextSpan,
+)
 from .impl.langchain import (
     LangchainTextSplitter,
 )
+from .impl.tiktoken import TiktokenTextSplitter
 
 
 __all__ = [
     "ITextSplitter",
+    "IStreamingTextSplitter",
     "TextSplitterArguments",
+    "TextSpan",
     "LangchainTextSplitter",
+    "TiktokenTextSplitter",
 ]
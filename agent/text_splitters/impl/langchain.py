@@ -1,8 +1,12 @@
 import asyncio
 from concurrent.futures import Executor, ProcessPoolExecutor
+from functools import lru_cache
+from typing import Final
+import tiktoken
 from langchain_text_splitters import TokenTextSplitter
 from pydantic import BaseModel
 
+from agent.batched import Batched
 from agent.text_splitters.interface import TextSplitterArguments
 
 
@@ -10,7 +14,32 @@ class LangchainSplitterSettings(BaseModel):
     number_executor_split_tokens: int = 2
 
 
+# Cached per worker process, so the encoding is looked up once per arguments
+@lru_cache(maxsize=16)
+def _get_encoding(encoding_model_name: str) -> tiktoken.Encoding:
+    return tiktoken.encoding_for_model(encoding_model_name)
+
+
+@lru_cache(maxsize=16)
+def _get_token_splitter(
+    encoding_model_name: str,
+    chunk_size: int,
+    chunk_overlap: int,
+) -> TokenTextSplitter:
+    return TokenTextSplitter(
+        model_name=encoding_model_name,
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+    )
+
+
 class LangchainTextSplitter:
+    # Initial prefix window when truncating, grown x2 until it holds enough
+    TRUNCATE_CHARS_PER_TOKEN: Final[int] = 6
+    # Tokens at the end of a prefix window may merge differently than in the
+    # full text, so the window must hold a few more tokens than are kept.
+    TRUNCATE_MARGIN_TOKENS: Final[int] = 16
+
     def __init__(
         self,
         settings: LangchainSplitterSettings | None = None,
@@ -28,12 +57,57 @@ class LangchainTextSplitter:
         chunk_size: int,
         chunk_overlap: int,
     ) -> list[str]:
-        return TokenTextSplitter(
-            model_name=encoding_model_name,
-            chunk_size=chunk_size,
-            chunk_overlap=chunk_overlap,
+        return _get_token_splitter(
+            encoding_model_name, chunk_size, chunk_overlap
         ).split_text(text)
 
+    @staticmethod
+    def _split_texts(
+        texts: list[str],
+        encoding_model_name: str,
+        chunk_size: int,
+        chunk_overlap: int,
+    ) -> list[list[str]]:
+        splitter = _get_token_splitter(encoding_model_name, chunk_size, chunk_overlap)
+        return [splitter.split_text(text) for text in texts]
+
+    @staticmethod
+    def _count_tokens(texts: list[str], encoding_model_name: str) -> list[int]:
+        encoding = _get_encoding(encoding_model_name)
+        return [len(tokens) for tokens in encoding.encode_ordinary_batch(texts)]
+
+    @classmethod
+    def _truncate_texts(
+        cls,
+        texts: list[str],
+        encoding_model_name: str,
+        max_tokens: int,
+    ) -> list[str]:
+        encoding = _get_encoding(encoding_model_name)
+
+        if max_tokens <= 0:
+            return [""] * len(texts)
+
+        truncated_texts: list[str] = []
+        for text in texts:
+            window = max_tokens * cls.TRUNCATE_CHARS_PER_TOKEN
+            while True:
+                prefix = text[:window]
+                tokens = encoding.encode_ordinary(prefix)
+                if len(prefix) == len(text):
+                    truncated_texts.append(
+                        text
+                        if len(tokens) <= max_tokens
+                        else encoding.decode(tokens[:max_tokens])
+                    )
+                    break
+                if len(tokens) > max_tokens + cls.TRUNCATE_MARGIN_TOKENS:
+                    truncated_texts.append(encoding.decode(tokens[:max_tokens]))
+                    break
+                window *= 2
+
+        return truncated_texts
+
     async def asplit_text(
         self,
         text: str,
@@ -50,3 +124,68 @@ class LangchainTextSplitter:
             arguments.chunk_size,
             arguments.chunk_overlap,
         )
+
+    async def asplit_texts(
+        self,
+        texts: list[str],
+        arguments: TextSplitterArguments | None = None,
+    ) -> list[list[str]]:
+        arguments = arguments or TextSplitterArguments()
+        loop = asyncio.get_event_loop()
+
+        # One round trip per worker, each with a similar number of characters
+        groups = Batched.balance(
+            [len(text) for text in texts],
+            self.settings.number_executor_split_tokens,
+        )
+        groups_splitted_texts = await asyncio.gather(
+            *[
+                loop.run_in_executor(
+                    self.executor_split_tokens,
+                    self._split_texts,
+                    [texts[idx] for idx in group],
+                    arguments.encoding_model_name,
+                    arguments.chunk_size,
+                    arguments.chunk_overlap,
+                )
+                for group in groups
+            ]
+        )
+
+        splitted_texts_list: list[list[str]] = [[] for _ in texts]
+        for group, splitted_texts_group in zip(groups, groups_splitted_texts):
+            for idx, splitted_texts in zip(group, splitted_texts_group):
+                splitted_texts_list[idx] = splitted_texts
+        return splitted_texts_list
+
+    async def acount_tokens(
+        self,
+        texts: list[str],
+        arguments: TextSplitterArguments | None = None,
+    ) -> list[int]:
+        arguments = arguments or TextSplitterArguments()
+        loop = asyncio.get_event_loop()
+
+        return await loop.run_in_executor(
+            self.executor_split_tokens,
+            self._count_tokens,
+            texts,
+            arguments.encoding_model_name,
+        )
+
+    async def atruncate_texts(
+        self,
+        texts: list[str],
+        max_tokens: int,
+        arguments: TextSplitterArguments | None = None,
+    ) -> list[str]:
+        arguments = arguments or TextSplitterArguments()
+        loop = asyncio.get_event_loop()
+
+        return await loop.run_in_executor(
+            self.executor_split_tokens,
+            self._truncate_texts,
+            texts,
+            arguments.encoding_model_name,
+            max_tokens,
+        )
@@ -0,0 +1,339 @@
+import asyncio
+from collections.abc import AsyncGenerator, AsyncIterable
+from concurrent.futures import Executor, ProcessPoolExecutor
+from functools import lru_cache
+from typing import Final
+
+import tiktoken
+from pydantic import BaseModel
+
+from agent.batched import Batched
+from agent.text_splitters.interface import TextSpan, TextSplitterArguments
+
+
+class TiktokenSplitterSettings(BaseModel):
+    number_executor_split_tokens: int = 2
+
+
+# Cached per worker process, so the encoding is looked up once per model
+@lru_cache(maxsize=16)
+def _get_encoding(encoding_model_name: str) -> tiktoken.Encoding:
+    return tiktoken.encoding_for_model(encoding_model_name)
+
+
+class TiktokenSpanStream:
+    # Tokens are committed only up to a stable boundary: a token that starts
+    # with whitespace (a pre-tokenizer boundary) at least STABLE_MARGIN_CHARS
+    # before the end of the buffered text, so later pieces cannot change how
+    # committed text is tokenized. Text without whitespace is cut anywhere
+    # once the uncommitted tail grows past MAX_TAIL_CHARS.
+    STABLE_MARGIN_CHARS: Final[int] = 64
+    MAX_TAIL_CHARS: Final[int] = 16384
+
+    def __init__(
+        self,
+        encoding_model_name: str,
+        chunk_size: int,
+        chunk_overlap: int,
+    ) -> None:
+        if chunk_overlap >= chunk_size:
+            raise ValueError(
+                f"chunk_overlap ({chunk_overlap}) must be smaller than "
+                f"chunk_size ({chunk_size})"
+            )
+
+        self.encoding = _get_encoding(encoding_model_name)
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+
+        # Buffered text starts at the first retained token, `text_start`
+        # characters into the stream. `token_starts` holds the stream offset
+        # of every retained committed token, and committed text ends at
+        # `committed_end`; the rest of the buffer is the uncommitted tail.
+        self.text = ""
+        self.text_start = 0
+        self.token_starts: list[int] = []
+        self.committed_end = 0
+        # Leading retained tokens that were already part of a yielded span
+        self.num_yielded = 0
+
+    def _commit(self, final: bool) -> None:
+        tail = self.text[self.committed_end - self.text_start :]
+        if not tail:
+            return
+
+        tokens = self.encoding.encode_ordinary(tail)
+        _, offsets = self.encoding.decode_with_offsets(tokens)
+        offsets.append(len(tail))
+
+        num_tokens = len(tokens)
+        if not final:
+            stable_end = len(tail) - self.STABLE_MARGIN_CHARS
+            num_tokens = next(
+                (
+                    idx
+                    for idx in range(len(tokens) - 1, 0, -1)
+                    if offsets[idx] <= stable_end and tail[offsets[idx]].isspace()
+                ),
+                0,
+            )
+            if num_tokens == 0 and len(tail) > self.MAX_TAIL_CHARS:
+                num_tokens = next(
+                    (
+                        idx
+                        for idx in range(len(tokens) - 1, 0, -1)
+                        if offsets[idx] <= stable_end
+                    ),
+                    0,
+                )
+
+        self.token_starts.extend(
+            self.committed_end + offset for offset in offsets[:num_tokens]
+        )
+        self.committed_end += offsets[num_tokens]
+
+    def _emit(self, final: bool) -> list[TextSpan]:
+        spans: list[TextSpan] = []
+        while len(self.token_starts) > self.num_yielded and (
+            final or len(self.token_starts) >= self.chunk_size
+        ):
+            num_tokens = min(self.chunk_size, len(self.token_starts))
+            start = self.token_starts[0]
+            end = (
+                self.token_starts[num_tokens]
+                if num_tokens < len(self.token_starts)
+                else self.committed_end
+            )
+            spans.append(
+                TextSpan.model_construct(
+                    text=self.text[start - self.text_start : end - self.text_start],
+                    start=start,
+                    end=end,
+                    num_tokens=num_tokens,
+                )
+            )
+            if final and num_tokens == len(self.token_starts):
+                self.token_starts = []
+                break
+
+            # The last `chunk_overlap` tokens open the next span
+            del self.token_starts[: num_tokens - self.chunk_overlap]
+            self.num_yielded = self.chunk_overlap
+
+        # Drop text that no future span can include
+        next_start = self.token_starts[0] if self.token_starts else self.committed_end
+        self.text = self.text[next_start - self.text_start :]
+        self.text_start = next_start
+        return spans
+
+    def feed(self, piece: str) -> list[TextSpan]:
+        self.text += piece
+        self._commit(final=False)
+        return self._emit(final=False)
+
+    def close(self) -> list[TextSpan]:
+        self._commit(final=True)
+        return self._emit(final=True)
+
+
+class TiktokenTextSplitter:
+    # Splits on tiktoken token boundaries like LangChain's TokenTextSplitter,
+    # but chunks are sliced out of the source text by character offsets
+    # instead of being decoded from token slices.
+
+    # Initial prefix window when truncating, grown x2 until it holds enough
+    TRUNCATE_CHARS_PER_TOKEN: Final[int] = 6
+    # Tokens at the end of a prefix window may merge differently than in the
+    # full text, so the window must hold a few more tokens than are kept.
+    TRUNCATE_MARGIN_TOKENS: Final[int] = 16
+
+    def __init__(
+        self,
+        settings: TiktokenSplitterSettings | None = None,
+        executor_split_tokens: Executor | None = None,
+    ):
+        self.settings = settings or TiktokenSplitterSettings()
+        self.executor_split_tokens = executor_split_tokens or ProcessPoolExecutor(
+            max_workers=self.settings.number_executor_split_tokens
+        )
+
+    @staticmethod
+    def _split_spans(
+        texts: list[str],
+        encoding_model_name: str,
+        chunk_size: int,
+        chunk_overlap: int,
+    ) -> list[list[TextSpan]]:
+        if chunk_overlap >= chunk_size:
+            raise ValueError(
+                f"chunk_overlap ({chunk_overlap}) must be smaller than "
+                f"chunk_size ({chunk_size})"
+            )
+
+        encoding = _get_encoding(encoding_model_name)
+        spans_list: list[list[TextSpan]] = []
+        for text, tokens in zip(texts, encoding.encode_ordinary_batch(texts)):
+            # offsets[idx] is the character where token idx starts
+            _, offsets = encoding.decode_with_offsets(tokens)
+            offsets.append(len(text))
+
+            spans: list[TextSpan] = []
+            start = 0
+            while start < len(tokens):
+                end = min(start + chunk_size, len(tokens))
+                spans.append(
+                    TextSpan.model_construct(
+                        text=text[offsets[start] : offsets[end]],
+                        start=offsets[start],
+                        end=offsets[end],
+                        num_tokens=end - start,
+                    )
+                )
+                if end == len(tokens):
+                    break
+                start = end - chunk_overlap
+            spans_list.append(spans)
+
+        return spans_list
+
+    @staticmethod
+    def _count_tokens(texts: list[str], encoding_model_name: str) -> list[int]:
+        encoding = _get_encoding(encoding_model_name)
+        return [len(tokens) for tokens in encoding.encode_ordinary_batch(texts)]
+
+    @classmethod
+    def _truncate_texts(
+        cls,
+        texts: list[str],
+        encoding_model_name: str,
+        max_tokens: int,
+    ) -> list[str]:
+        encoding = _get_encoding(encoding_model_name)
+
+        if max_tokens <= 0:
+            return [""] * len(texts)
+
+        # Only a prefix of each text is encoded, see LangchainTextSplitter
+        truncated_texts: list[str] = []
+        for text in texts:
+            window = max_tokens * cls.TRUNCATE_CHARS_PER_TOKEN
+            while True:
+                prefix = text[:window]
+                tokens = encoding.encode_ordinary(prefix)
+                if len(prefix) == len(text) and len(tokens) <= max_tokens:
+                    truncated_texts.append(text)
+                    break
+                if (
+                    len(prefix) == len(text)
+                    or len(tokens) > max_tokens + cls.TRUNCATE_MARGIN_TOKENS
+                ):
+                    # Offsets of the whole prefix: a token slice may end inside
+                    # a multi-byte character and would not decode on its own
+                    _, offsets = encoding.decode_with_offsets(tokens)
+                    truncated_texts.append(text[: offsets[max_tokens]])
+                    break
+                window *= 2
+
+        return truncated_texts
+
+    async def asplit_spans(
+        self,
+        texts: list[str],
+        arguments: TextSplitterArguments | None = None,
+    ) -> list[list[TextSpan]]:
+        arguments = arguments or TextSplitterArguments()
+        loop = asyncio.get_event_loop()
+
+        # One round trip per worker, each with a similar number of characters
+        groups = Batched.balance(
+            [len(text) for text in texts],
+            self.settings.number_executor_split_tokens,
+        )
+        groups_spans = await asyncio.gather(
+            *[
+                loop.run_in_executor(
+                    self.executor_split_tokens,
+                    self._split_spans,
+                    [texts[idx] for idx in group],
+                    arguments.encoding_model_name,
+                    arguments.chunk_size,
+                    arguments.chunk_overlap,
+                )
+                for group in groups
+            ]
+        )
+
+        spans_list: list[list[TextSpan]] = [[] for _ in texts]
+        for group, group_spans in zip(groups, groups_spans):
+            for idx, spans in zip(group, group_spans):
+                spans_list[idx] = spans
+        return spans_list
+
+    async def asplit_text(
+        self,
+        text: str,
+        arguments: TextSplitterArguments | None = None,
+    ) -> list[str]:
+        (splitted_texts,) = await self.asplit_texts([text], arguments=arguments)
+        return splitted_texts
+
+    async def asplit_texts(
+        self,
+        texts: list[str],
+        arguments: TextSplitterArguments | None = None,
+    ) -> list[list[str]]:
+        return [
+            [span.text for span in spans]
+            for spans in await self.asplit_spans(texts, arguments=arguments)
+        ]
+
+    async def acount_tokens(
+        self,
+        texts: list[str],
+        arguments: TextSplitterArguments | None = None,
+    ) -> list[int]:
+        arguments = arguments or TextSplitterArguments()
+        loop = asyncio.get_event_loop()
+
+        return await loop.run_in_executor(
+            self.executor_split_tokens,
+            self._count_tokens,
+            texts,
+            arguments.encoding_model_name,
+        )
+
+    async def atruncate_texts(
+        self,
+        texts: list[str],
+        max_tokens: int,
+        arguments: TextSplitterArguments | None = None,
+    ) -> list[str]:
+        arguments = arguments or TextSplitterArguments()
+        loop = asyncio.get_event_loop()
+
+        return await loop.run_in_executor(
+            self.executor_split_tokens,
+            self._truncate_texts,
+            texts,
+            arguments.encoding_model_name,
+            max_tokens,
+        )
+
+    async def asplit_stream(
+        self,
+        pieces: AsyncIterable[str],
+        arguments: TextSplitterArguments | None = None,
+    ) -> AsyncGenerator[TextSpan, None]:
+        arguments = arguments or TextSplitterArguments()
+        stream = TiktokenSpanStream(
+            arguments.encoding_model_name,
+            arguments.chunk_size,
+            arguments.chunk_overlap,
+        )
+
+        # Encoding releases the GIL, so a thread keeps the event loop free
+        async for piece in pieces:
+            for span in await asyncio.to_thread(stream.feed, piece):
+                yield span
+        for span in await asyncio.to_thread(stream.close):
+            yield span
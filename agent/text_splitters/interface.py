@@ -1,3 +1,4 @@
+from collections.abc import AsyncGenerator, AsyncIterable
 from typing import Protocol
 
 from pydantic import BaseModel
@@ -9,9 +10,46 @@ class TextSplitterArguments(BaseModel):
     encoding_model_name: str = "gpt-4o"
 
 
+class TextSpan(BaseModel):
+    text: str
+    # Character offsets into the source text, `text == source[start:end]`
+    start: int
+    end: int
+    num_tokens: int
+
+
 class ITextSplitter(Protocol):
     async def asplit_text(
         self,
         text: str,
         arguments: TextSplitterArguments | None = None,
     ) -> list[str]: ...
+
+    async def asplit_texts(
+        self,
+        texts: list[str],
+        arguments: TextSplitterArguments | None = None,
+    ) -> list[list[str]]: ...
+
+    async def acount_tokens(
+        self,
+        texts: list[str],
+        arguments: TextSplitterArguments | None = None,
+    ) -> list[int]: ...
+
+    async def atruncate_texts(
+        self,
+        texts: list[str],
+        max_tokens: int,
+        arguments: TextSplitterArguments | None = None,
+    ) -> list[str]: ...
+
+
+class IStreamingTextSplitter(Protocol):
+    # Spans are yielded as soon as they are complete, with offsets relative
+    # to the concatenation of all pieces.
+    def asplit_stream(
+        self,
+        pieces: AsyncIterable[str],
+        arguments: TextSplitterArguments | None = None,
+    ) -> AsyncGenerator[TextSpan, None]: ...
@@ -1,37 +1,63 @@
 import asyncio
 import logging
 
+from pydantic import BaseModel
+
 from agent.embeddings.interface import IEmbeddingModel
-from agent.models.document import ScoredChunks
-from agent.storages.vectordb.milvus import Milvus
+from agent.models.document import FusionMethod, ScoredChunks
+from agent.storages.vectordb.interface import IVectorStore
 from agent.searches import IWebSearch
 
 
 logger = logging.getLogger(__name__)
 
 
+class HybridSearchSettings(BaseModel):
+    fusion_method: FusionMethod = FusionMethod.RRF
+    rrf_k: int = 60
+    # Estimated Jaccard similarity of word trigrams, see MinHash
+    near_duplicate_threshold: float | None = 0.7
+    mmr_lambda: float | None = None
+    mmr_fetch_k: int = 20
+
+
 class HybridSearch:
     def __init__(
         self,
         websearch: IWebSearch,
-        milvus: Milvus,
+        vectordb: IVectorStore,
         embedding_model: IEmbeddingModel,
+        settings: HybridSearchSettings | None = None,
     ) -> None:
         self.websearch = websearch
-        self.milvus = milvus
+        self.vectordb = vectordb
         self.embedding_model = embedding_model
+        self.settings = settings or HybridSearchSettings()
 
     async def semantic_search(
         self,
         query: str,
         top_k: int = 5,
+        min_score: float | None = None,
     ) -> ScoredChunks:
         query_embedding = await self.embedding_model.aembedding([query])
 
         if len(query_embedding) == 0:
             raise ValueError("Query embedding is empty")
 
-        vectordb_results = await self.milvus.search(query_embedding[0], top_k=top_k)
+        use_mmr = self.settings.mmr_lambda is not None
+        vectordb_results = await self.vectordb.search(
+            query_embedding[0],
+            top_k=max(top_k, self.settings.mmr_fetch_k) if use_mmr else top_k,
+            min_score=min_score,
+            with_embeddings=use_mmr,
+        )
+        if self.settings.mmr_lambda is not None:
+            vectordb_results.mmr(
+                query_embedding[0].embedding,
+                top_k=top_k,
+                lambda_mult=self.settings.mmr_lambda,
+            )
 
         logger.info("Retrieve %d semantic results", len(vectordb_results.root))
 
@@ -54,4 +80,13 @@ class HybridSearch:
             [len(retrieval) for retrieval in retrieval_list],
         )
 
-        return ScoredChunks([]).extend(retrieval_list)
+        fused = ScoredChunks.fuse(
+            retrieval_list,
+            top_k=top_k,
+            method=self.settings.fusion_method,
+            rrf_k=self.settings.rrf_k,
+        )
+        if self.settings.near_duplicate_threshold is not None:
+            fused.deduplicate(self.settings.near_duplicate_threshold)
+
+        return fused
@@ -1,45 +1,99 @@
 from pathlib import Path
-import time
 
+import argparse
 import logging
 import glob
 import asyncio
 
 from agent.container import Container
+from agent.pipelines import (
+    IndexingJob,
+    IndexingManifest,
+    IndexingPipeline,
+    IndexingWorker,
+    JobQueue,
+)
 
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-async def main():
-    container = Container()
+def init_pipeline(container: Container, manifest: IndexingManifest):
+    return IndexingPipeline(
+        extractor=container.extractors.get("pdf"),
+        embedding_model=container.embeddings.get("azure_openai"),
+        vectordb=container.vectordbs.get("milvus"),
+        manifest=manifest,
+    )
+
+
+async def run(container: Container, manifest: IndexingManifest, filedir: str):
+    pipeline = init_pipeline(container, manifest)
+    report = await pipeline.arun(
+        IndexingJob(Path(filepath)) for filepath in glob.glob(f"{filedir}/*.pdf")
+    )
+    logger.info(
+        "Indexed %d chunks, %d boilerplate tokens skipped",
+        report.num_chunks,
+        report.extraction.num_tokens_saved,
+    )
+
 
-    filedir: str = "datas/references/booking"
-    for filepath in glob.glob(f"{filedir}/*.pdf"):
-        filepath = Path(filepath)
-        logger.info("Processing %s", filepath)
+async def enqueue(
+    container: Container, queue: JobQueue, filedir: str, pages_per_job: int | None
+):
+    extractor = container.extractors.get("pdf")
+    num_jobs = 0
+    for filepath in map(Path, glob.glob(f"{filedir}/*.pdf")):
+        num_pages = None
+        if pages_per_job is not None:
+            num_pages = await extractor.acount_pages(filepath)
+        num_jobs += queue.enqueue(filepath, num_pages, pages_per_job)
+    logger.info("Enqueued %d jobs: %s", num_jobs, queue.summary())
 
-        extract_start_time = time.perf_counter()
-        document = await container.extractors.get("pdf").aextract(filepath)
-        logger.info("Extracting time: %.3f", time.perf_counter() - extract_start_time)
 
-        embed_start_time = time.perf_counter()
-        embeddings = await container.embeddings.get("azure_openai").aembedding(
-            [chunk.text for chunk in document.chunks]
-        )
-        logger.info("Embedding time: %.3f", time.perf_counter() - embed_start_time)
+async def work(
+    container: Container, manifest: IndexingManifest, queue: JobQueue, concurrency: int
+):
+    worker = IndexingWorker(
+        queue, init_pipeline(container, manifest), concurrency=concurrency
+    )
+    await worker.arun()
 
-        milvus_start_time = time.perf_counter()
-        await container.vectordbs.get("milvus").add(document.chunks, embeddings)
-        logger.info(
-            "Milvus indexing time: %.3f", time.perf_counter() - milvus_start_time
-        )
+
+def summary(manifest: IndexingManifest, queue: JobQueue):
+    manifest_summary = manifest.summary()
+    logger.info("%s", manifest_summary)
+    logger.info("Jobs: %s", queue.summary())
+    for document_key in manifest_summary.incomplete_files:
+        logger.info("Incomplete: %s", document_key)
 
 
 if __name__ == "__main__":
-    loop = asyncio.get_event_loop()
-    try:
-        loop.run_until_complete(main())
-    finally:
-        loop.close()
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "command",
+        nargs="?",
+        choices=["run", "enqueue", "worker", "summary"],
+        default="run",
+    )
+    parser.add_argument("--filedir", default="datas/references/booking")
+    # enqueue: split files into page-range jobs instead of one job per file
+    parser.add_argument("--pages-per-job", type=int, default=None)
+    # worker: jobs run concurrently by this process
+    parser.add_argument("--concurrency", type=int, default=2)
+    args = parser.parse_args()
+
+    container = Container()
+    manifest = IndexingManifest(Path(container.env.indexing_manifest_path))
+    queue = JobQueue(Path(container.env.indexing_queue_path))
+    match args.command:
+        case "enqueue":
+            asyncio.run(enqueue(container, queue, args.filedir, args.pages_per_job))
+        case "worker":
+            asyncio.run(work(container, manifest, queue, args.concurrency))
+        case "summary":
+            summary(manifest, queue)
+        case _:
+            asyncio.run(run(container, manifest, args.filedir))
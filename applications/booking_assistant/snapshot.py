@@ -0,0 +1,41 @@
+import argparse
+import asyncio
+import logging
+import time
+from pathlib import Path
+
+from agent.container import Container
+
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+async def main(command: str, snapshotdir: Path) -> None:
+    container = Container()
+    milvus = container.vectordbs.init_milvus()
+
+    start_time = time.perf_counter()
+    match command:
+        case "export":
+            manifest = milvus.export_snapshot(snapshotdir)
+        case "restore":
+            manifest = await milvus.restore_snapshot(snapshotdir)
+        case _:
+            raise ValueError(f"Unknown command: {command}")
+
+    logger.info(
+        "%s %d entities in %.3f",
+        command.capitalize(),
+        manifest.num_entities,
+        time.perf_counter() - start_time,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("command", choices=["export", "restore"])
+    parser.add_argument("snapshotdir", type=Path)
+    args = parser.parse_args()
+
+    asyncio.run(main(args.command, args.snapshotdir))
@@ -0,0 +1,286 @@
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import random
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import asdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any
+
+import pymupdf
+
+from agent.embeddings import SmallOpenAIEmbeddingModel
+from agent.extractors import PDFExtractor, PDFExtractorSettings
+from agent.extractors.impl.pdf import PDFRenderSettings
+from agent.models.embeddings import EmbeddingSize
+from agent.pipelines import IndexingJob, IndexingPipeline, IndexingPipelineSettings
+from agent.storages.local import Storage
+from agent.storages.vectordb import Milvus
+from agent.text_splitters import LangchainTextSplitter, TiktokenTextSplitter
+
+
+WORDS = (
+    "booking guest room hotel check in out breakfast included cancellation "
+    "policy refund deposit payment card night stay suite view pool parking "
+    "airport shuttle transfer reception desk open hours late arrival child "
+    "extra bed pet allowed fee tax service charge wifi free floor elevator"
+).split()
+API_VERSION = "2024-08-01-preview"
+DEPLOYMENT_NAME = "benchmark-embedding"
+
+
+def generate_pdfs(
+    pdfdir: Path, num_documents: int, num_pages: int, words_per_page: int, seed: int
+) -> list[Path]:
+    # Running header and footer lines exercise the boilerplate detection
+    rng = random.Random(seed)
+    pdfdir.mkdir(parents=True, exist_ok=True)
+    filepaths = []
+    for docidx in range(num_documents):
+        filepath = pdfdir / f"document-{docidx:04d}.pdf"
+        with pymupdf.open() as document:
+            for pageidx in range(1, num_pages + 1):
+                page = document.new_page()
+                words = rng.choices(WORDS, k=words_per_page)
+                paragraphs = [
+                    " ".join(words[start : start + 60]).capitalize() + "."
+                    for start in range(0, len(words), 60)
+                ]
+                page.insert_text((72, 40), "Synthetic Hotels Ltd - Guest handbook")
+                page.insert_textbox(
+                    pymupdf.Rect(72, 72, page.rect.width - 72, page.rect.height - 72),
+                    "\n\n".join(paragraphs),
+                    fontsize=9,
+                )
+                page.insert_text((72, page.rect.height - 40), f"Page {pageidx}")
+            document.save(filepath)
+        filepaths.append(filepath)
+    return filepaths
+
+
+def serve_embeddings(port: int, latency: float, dimensions: int) -> None:
+    # Every request gets the same vector after `latency` seconds, so the
+    # server costs next to nothing and only the round trip is simulated
+    body = json.dumps(
+        {
+            "object": "list",
+            "model": DEPLOYMENT_NAME,
+            "data": [
+                {
+                    "object": "embedding",
+                    "index": 0,
+                    "embedding": [random.gauss(0, 1) for _ in range(dimensions)],
+                }
+            ],
+            "usage": {"prompt_tokens": 0, "total_tokens": 0},
+        }
+    ).encode()
+
+    class EmbeddingsHandler(BaseHTTPRequestHandler):
+        # HTTP/1.1 keeps the client's pooled connections open
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self) -> None:
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            time.sleep(latency)
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format: str, *args: Any) -> None:
+            pass
+
+    class EmbeddingsServer(ThreadingHTTPServer):
+        # The default backlog of 5 stalls bursts of new connections
+        request_queue_size = 1024
+
+    # One thread per connection, concurrent requests wait in parallel
+    with EmbeddingsServer(("127.0.0.1", port), EmbeddingsHandler) as server:
+        server.serve_forever()
+
+
+def start_embedding_server(latency: float, dimensions: int) -> tuple[str, Any]:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    # A separate process keeps the stub off the benchmarked event loop
+    process = multiprocessing.Process(
+        target=serve_embeddings, args=(port, latency, dimensions), daemon=True
+    )
+    process.start()
+    deadline = time.monotonic() + 10
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+            break
+        except OSError:
+            if time.monotonic() > deadline:
+                process.terminate()
+                raise RuntimeError("Stub embedding server did not start")
+            time.sleep(0.05)
+    return f"http://127.0.0.1:{port}", process
+
+
+def peak_rss_mb() -> dict[str, float]:
+    # ru_maxrss is in kilobytes on Linux; children are the extraction workers
+    return {
+        "self": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "children": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024,
+    }
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args: argparse.Namespace, workdir: Path) -> dict[str, Any]:
+    filepaths = generate_pdfs(
+        workdir / "pdfs",
+        args.num_documents,
+        args.num_pages,
+        args.words_per_page,
+        args.seed,
+    )
+    endpoint, server = start_embedding_server(
+        args.embedding_latency_ms / 1000, EmbeddingSize.small
+    )
+    try:
+        text_splitter = (
+            TiktokenTextSplitter()
+            if args.text_splitter == "tiktoken"
+            else LangchainTextSplitter()
+        )
+        pipeline = IndexingPipeline(
+            extractor=PDFExtractor(
+                Storage(imagedir=workdir / "images"),
+                text_splitter,
+                settings=PDFExtractorSettings(
+                    render=PDFRenderSettings(mode=args.render_mode)
+                ),
+            ),
+            embedding_model=SmallOpenAIEmbeddingModel(
+                api_key="benchmark",
+                api_version=API_VERSION,
+                azure_endpoint=endpoint,
+                deployment_name=DEPLOYMENT_NAME,
+            ),
+            vectordb=Milvus(
+                uri=str(workdir / "milvus.db"), collection_name="benchmark"
+            ),
+            settings=IndexingPipelineSettings(
+                number_extract_workers=args.extract_workers,
+                number_embed_workers=args.embed_workers,
+                number_insert_workers=args.insert_workers,
+            ),
+        )
+
+        start_time = time.perf_counter()
+        report = await pipeline.arun(IndexingJob(filepath) for filepath in filepaths)
+        elapsed_seconds = time.perf_counter() - start_time
+    finally:
+        server.terminate()
+        server.join()
+
+    num_pages = report.extraction.num_pages
+    return {
+        "commit": git_commit(),
+        "config": {
+            key: value
+            for key, value in vars(args).items()
+            if key not in ("output", "compare")
+        },
+        "elapsed_seconds": elapsed_seconds,
+        "num_pages": num_pages,
+        "num_chunks": report.num_chunks,
+        "pages_per_second": num_pages / elapsed_seconds,
+        "chunks_per_second": report.num_chunks / elapsed_seconds,
+        "peak_rss_mb": peak_rss_mb(),
+        "stages": {
+            name: {
+                "num_items": stats.num_items,
+                "num_units": stats.num_units,
+                "unit": stats.unit,
+                "busy_seconds": stats.busy_seconds,
+                "elapsed_seconds": stats.elapsed_seconds,
+                "units_per_second": stats.units_per_second,
+            }
+            for name, stats in report.stages.items()
+        },
+        "extraction": asdict(report.extraction),
+    }
+
+
+def headline(result: dict[str, Any]) -> dict[str, float]:
+    return {
+        "pages_per_second": result["pages_per_second"],
+        "chunks_per_second": result["chunks_per_second"],
+        "peak_rss_mb.self": result["peak_rss_mb"]["self"],
+        **{
+            f"{name}.busy_seconds": stats["busy_seconds"]
+            for name, stats in result["stages"].items()
+        },
+    }
+
+
+def compare(result: dict[str, Any], baseline: dict[str, Any]) -> None:
+    baseline_headline = headline(baseline)
+    for key, new in headline(result).items():
+        old = baseline_headline.get(key)
+        if old is None:
+            continue
+        change = (new - old) / old * 100 if old else float("nan")
+        print(
+            f"{key:<24} {old:10.2f} -> {new:10.2f} ({change:+6.1f}%)", file=sys.stderr
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num-documents", type=int, default=8)
+    parser.add_argument("--num-pages", type=int, default=25)
+    parser.add_argument("--words-per-page", type=int, default=400)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--embedding-latency-ms", type=float, default=50.0)
+    parser.add_argument(
+        "--text-splitter", choices=["langchain", "tiktoken"], default="langchain"
+    )
+    parser.add_argument(
+        "--render-mode", choices=["eager", "lazy", "off"], default="eager"
+    )
+    parser.add_argument("--extract-workers", type=int, default=2)
+    parser.add_argument("--embed-workers", type=int, default=4)
+    parser.add_argument("--insert-workers", type=int, default=2)
+    parser.add_argument("--output", type=Path, help="JSON report, stdout when unset")
+    parser.add_argument("--compare", type=Path, help="JSON report of a previous run")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    with tempfile.TemporaryDirectory() as workdir:
+        result = asyncio.run(run(args, Path(workdir)))
+
+    payload = json.dumps(result, indent=2)
+    if args.output is None:
+        print(payload)
+    else:
+        args.output.write_text(payload)
+    if args.compare is not None:
+        compare(result, json.loads(args.compare.read_text()))
@@ -0,0 +1,34 @@
+from pathlib import Path
+
+from agent.pipelines.jobqueue import JobQueue
+
+
+def test_enqueue_whole_file_twice_is_noop(tmp_path: Path) -> None:
+    queue = JobQueue(tmp_path / "queue.db")
+    filepath = tmp_path / "document.pdf"
+
+    assert queue.enqueue(filepath) == 1
+    assert queue.enqueue(filepath) == 0
+    assert queue.summary() == {"pending": 1}
+
+
+def test_enqueue_page_ranges_twice_is_noop(tmp_path: Path) -> None:
+    queue = JobQueue(tmp_path / "queue.db")
+    filepath = tmp_path / "document.pdf"
+
+    assert queue.enqueue(filepath, num_pages=10, pages_per_job=4) == 3
+    assert queue.enqueue(filepath, num_pages=10, pages_per_job=4) == 0
+    assert queue.summary() == {"pending": 3}
+
+
+def test_enqueue_done_job_is_not_requeued(tmp_path: Path) -> None:
+    queue = JobQueue(tmp_path / "queue.db")
+    filepath = tmp_path / "document.pdf"
+    queue.enqueue(filepath)
+    job = queue.claim("worker")
+    assert job is not None
+    queue.complete(job, "worker")
+
+    assert queue.enqueue(filepath) == 0
+    assert queue.claim("worker") is None
+    assert queue.summary() == {"done": 1}
@@ -0,0 +1,64 @@
+import random
+
+import pytest
+
+from agent.minhash import MinHash
+
+
+def words(seed: int, num_words: int = 200) -> list[str]:
+    rng = random.Random(seed)
+    return [f"word{rng.randrange(3000)}" for _ in range(num_words)]
+
+
+def replace_words(text: list[str], num_replaced: int, seed: int) -> list[str]:
+    rng = random.Random(seed)
+    replaced = list(text)
+    for idx in rng.sample(range(len(text)), num_replaced):
+        replaced[idx] = f"other{rng.randrange(3000)}"
+    return replaced
+
+
+@pytest.mark.parametrize("num_replaced", [0, 1, 3, 5])
+def test_near_duplicates_are_merged(num_replaced: int) -> None:
+    # Up to 5 of 200 words replaced: Jaccard similarity above 0.85
+    for seed in range(20):
+        text = words(seed)
+        near_duplicate = replace_words(text, num_replaced, seed)
+        texts = [" ".join(text), " ".join(near_duplicate)]
+        assert MinHash.unique(texts, threshold=0.7) == [0]
+
+
+@pytest.mark.parametrize("num_replaced", [20, 40])
+def test_edited_texts_are_kept(num_replaced: int) -> None:
+    # 20 of 200 words replaced: Jaccard similarity below 0.6
+    for seed in range(20):
+        text = words(seed)
+        edited = replace_words(text, num_replaced, seed)
+        texts = [" ".join(text), " ".join(edited)]
+        assert MinHash.unique(texts, threshold=0.7) == [0, 1]
+
+
+def test_distinct_texts_are_kept() -> None:
+    texts = [" ".join(words(seed)) for seed in range(50)]
+    assert MinHash.unique(texts, threshold=0.5) == list(range(50))
+
+
+def test_similarity_estimates_jaccard() -> None:
+    text = words(0)
+    edited = replace_words(text, 10, 0)
+    shingles = [
+        {" ".join(tokens[idx : idx + 3]) for idx in range(len(tokens) - 2)}
+        for tokens in (text, edited)
+    ]
+    jaccard = len(shingles[0] & shingles[1]) / len(shingles[0] | shingles[1])
+
+    similarity = MinHash.similarity(
+        MinHash.signature(" ".join(text)), MinHash.signature(" ".join(edited))
+    )
+    assert similarity == pytest.approx(jaccard, abs=0.1)
+
+
+def test_first_of_duplicates_is_kept() -> None:
+    text = " ".join(words(0))
+    other = " ".join(words(1))
+    assert MinHash.unique([text, other, text, other]) == [0, 1]